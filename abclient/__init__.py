@@ -0,0 +1,11 @@
+"""Local-evaluation client for the AB Onboarding API.
+
+    from abclient import ABClient
+
+    with ABClient("http://127.0.0.1:8000") as ab:
+        variant = ab.assign("u42", "onboarding_progressive_v1", {"country": "FR"})
+        ab.track("u42", "onboarding_progressive_v1", "signup_complete")
+"""
+from .client import EXPOSURE_EVENT, ABClient, SnapshotError
+
+__all__ = ["ABClient", "EXPOSURE_EVENT", "SnapshotError"]
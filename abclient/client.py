@@ -0,0 +1,261 @@
+import gzip, json, logging, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional
+
+import requests
+
+from abcore.bucketing import stable_bucket
+from abcore.config import AppConfig, build_config
+from abcore.writer import BatchWriter
+
+log = logging.getLogger(__name__)
+
+EXPOSURE_EVENT = "exposure"
+# /events/bulk answers that reject a whole batch for good (malformed, too large, invalid)
+FINAL_STATUSES = (400, 413, 422)
+
+class SnapshotError(RuntimeError):
+    """No config snapshot could be fetched from the API."""
+
+class ABClient:
+    """Assigns variants in-process from a config snapshot pulled from the API.
+
+    `assign` uses the server's own hashing, allocation tables and targeting
+    (built by `abcore.config.build_config` from `/config/snapshot`), in
+    microseconds and without I/O. The snapshot is refreshed every
+    `refresh_interval` seconds with a conditional GET; if the API is
+    unreachable the last snapshot stays in use.
+
+    Unlike `/assign`, the client does not read stored assignments: for a
+    user assigned before an allocation change, or first assigned through
+    `/event`, it computes the variant from the current allocation, which
+    may differ from the sticky one. `/events/bulk` rejects such events as
+    variant mismatches. The client logs a warning, counts them in
+    `variant_mismatches`, and serves the stored variant it was told about
+    from then on (bounded like the exposure cache). Call `pin` with
+    assignments you already know (e.g. from `/assign`) to skip that first
+    rejected upload.
+
+    The first `assign` of a (user, experiment) queues an exposure event, and
+    `track` queues any other event; a background `BatchWriter` uploads them
+    as gzipped NDJSON to `/events/bulk`, which also stores the assignment.
+    When the upload queue is full, new events are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        refresh_interval: float = 30.0,
+        flush_interval: float = 1.0,
+        max_batch: int = 5000,
+        max_queue: int = 100_000,
+        timeout: float = 5.0,
+        retries: int = 3,
+        exposure_cache_size: int = 100_000,
+        session: Optional[requests.Session] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.retries = retries
+        self._session = session or requests.Session()
+        self._config: Optional[AppConfig] = None
+        self._etag: Optional[str] = None
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        # (user_id, experiment) pairs whose exposure was already queued
+        self._exposed: "OrderedDict[tuple, None]" = OrderedDict()
+        self._exposure_cache_size = exposure_cache_size
+        self._exposed_lock = threading.Lock()
+        # (user_id, experiment) -> variant the server has stored, when it differs from the computed one
+        self._pinned: "OrderedDict[tuple, str]" = OrderedDict()
+        self._pinned_lock = threading.Lock()
+        self._uploader: BatchWriter[Dict[str, Any]] = BatchWriter(
+            "abclient-uploader", self._upload, max_batch=max_batch,
+            interval=flush_interval, max_queue=max_queue,
+            # _upload retries transient failures itself; one layer, so attempts don't multiply
+            retries=0,
+        )
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.uploaded = 0
+        self.upload_rejected = 0
+        self.variant_mismatches = 0
+
+    # --- lifecycle ---
+
+    def start(self) -> "ABClient":
+        """Fetch the first snapshot (raises SnapshotError if impossible) and start the threads."""
+        if not self.refresh():
+            raise SnapshotError(f"could not fetch {self.base_url}/config/snapshot")
+        self._uploader.start()
+        if self.refresh_interval > 0 and not self._refresher:
+            self._stop.clear()
+            self._refresher = threading.Thread(target=self._refresh_loop, name="abclient-refresh", daemon=True)
+            self._refresher.start()
+        return self
+
+    def close(self) -> None:
+        """Stop refreshing and flush every queued event."""
+        self._stop.set()
+        if self._refresher:
+            self._refresher.join()
+            self._refresher = None
+        self._uploader.stop()
+        self._session.close()
+
+    def __enter__(self) -> "ABClient":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # --- snapshot ---
+
+    @property
+    def config(self) -> AppConfig:
+        if self._config is None:
+            raise SnapshotError("client not started")
+        return self._config
+
+    def refresh(self) -> bool:
+        """Conditional GET of the snapshot; False if the request failed."""
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+        try:
+            r = self._session.get(f"{self.base_url}/config/snapshot", headers=headers, timeout=self.timeout)
+            if r.status_code == 304:
+                return True
+            r.raise_for_status()
+            raw = r.json()
+            config = build_config(raw, raw["version"])
+        except Exception:
+            self.refresh_errors += 1
+            log.exception("config snapshot refresh failed, keeping %s",
+                          self._config.version if self._config else "nothing")
+            return False
+        if self._config is None or config.version != self._config.version:
+            log.info("config snapshot %s", config.version)
+        self._config = config
+        self._etag = r.headers.get("ETag")
+        self.refreshes += 1
+        return True
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    # --- evaluation ---
+
+    def variant(self, user_id: str, experiment: str, attributes: Optional[Mapping[str, Any]] = None) -> Optional[str]:
+        """The pinned or computed variant, or None (unknown, disabled or not eligible). No exposure."""
+        exp = self.config.experiments.get(experiment)
+        if exp is None or not exp.enabled:
+            return None
+        if exp.eligibility.evaluate(user_id, attributes or {}):
+            return None
+        with self._pinned_lock:
+            pinned = self._pinned.get((user_id, experiment))
+        return pinned or exp.variant_for_bucket(stable_bucket(user_id, experiment))
+
+    def pin(self, user_id: str, experiment: str, variant: str) -> None:
+        """Serve this stored assignment for the pair instead of the computed one."""
+        key = (user_id, experiment)
+        with self._pinned_lock:
+            self._pinned[key] = variant
+            self._pinned.move_to_end(key)
+            if len(self._pinned) > self._exposure_cache_size:
+                self._pinned.popitem(last=False)
+
+    def assign(self, user_id: str, experiment: str, attributes: Optional[Mapping[str, Any]] = None) -> Optional[str]:
+        """`variant`, plus an exposure event the first time this process sees the pair."""
+        variant = self.variant(user_id, experiment, attributes)
+        if variant is not None and self._first_exposure(user_id, experiment):
+            self._submit(user_id, experiment, variant, EXPOSURE_EVENT, None)
+        return variant
+
+    def track(self, user_id: str, experiment: str, event_type: str,
+              metadata: Optional[Dict[str, Any]] = None,
+              attributes: Optional[Mapping[str, Any]] = None) -> bool:
+        """Queue an event for the user's variant; False if they are not in the experiment."""
+        variant = self.variant(user_id, experiment, attributes)
+        if variant is None:
+            return False
+        return self._submit(user_id, experiment, variant, event_type, metadata)
+
+    def _first_exposure(self, user_id: str, experiment: str) -> bool:
+        key = (user_id, experiment)
+        with self._exposed_lock:
+            if key in self._exposed:
+                self._exposed.move_to_end(key)
+                return False
+            self._exposed[key] = None
+            if len(self._exposed) > self._exposure_cache_size:
+                self._exposed.popitem(last=False)
+            return True
+
+    # --- upload ---
+
+    def _submit(self, user_id: str, experiment: str, variant: str, event_type: str,
+                metadata: Optional[Dict[str, Any]]) -> bool:
+        event = {"user_id": user_id, "experiment_key": experiment, "variant": variant, "event_type": event_type}
+        if metadata:
+            event["metadata"] = metadata
+        return self._uploader.submit(event)
+
+    def _upload(self, batch: List[Dict[str, Any]]) -> None:
+        body = gzip.compress(b"\n".join(json.dumps(e, separators=(",", ":")).encode() for e in batch), 6)
+        headers = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+        for attempt in range(self.retries + 1):
+            try:
+                r = self._session.post(f"{self.base_url}/events/bulk", data=body, headers=headers,
+                                       timeout=self.timeout)
+                if r.status_code in FINAL_STATUSES:
+                    # the server refused the whole batch; sending it again would not change that
+                    self.upload_rejected += len(batch)
+                    log.error("/events/bulk refused %d events with %d: %s", len(batch), r.status_code, r.text[:200])
+                    return
+                if r.status_code < 500:
+                    r.raise_for_status()
+                    out = r.json()
+                    self.uploaded += out["accepted"]
+                    self.upload_rejected += out["rejected"]
+                    if out["rejected"]:
+                        self._rejected(batch, out["errors"])
+                    return
+            except (requests.ConnectionError, requests.Timeout):
+                pass
+            if attempt < self.retries:
+                time.sleep(min(0.5 * 2 ** attempt, 5.0))
+        # BatchWriter (retries=0) logs the batch and counts it as dropped
+        raise RuntimeError(f"uploading {len(batch)} events failed after {self.retries + 1} attempts")
+
+    def _rejected(self, batch: List[Dict[str, Any]], errors: List[Dict[str, Any]]) -> None:
+        """Pin the stored variant of every mismatched event's user and warn about all rejections."""
+        mismatches = [e for e in errors if e.get("assigned")]
+        for error in mismatches:
+            event = batch[error["line"] - 1]
+            self.pin(event["user_id"], event["experiment_key"], error["assigned"])
+        self.variant_mismatches += len(mismatches)
+        if mismatches:
+            log.warning("/events/bulk rejected %d events whose users already have another stored variant "
+                        "(e.g. %s); serving the stored variants from now on",
+                        len(mismatches), mismatches[0]["error"])
+        if len(errors) > len(mismatches):
+            other = next(e for e in errors if not e.get("assigned"))
+            log.warning("/events/bulk rejected %d events (e.g. line %d: %s)",
+                        len(errors) - len(mismatches), other["line"], other["error"])
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued event was uploaded or given up on; False on timeout."""
+        return self._uploader.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "config_version": self._config.version if self._config else None,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "uploaded": self.uploaded,
+            "upload_rejected": self.upload_rejected,
+            "variant_mismatches": self.variant_mismatches,
+            "uploader": self._uploader.stats(),
+        }
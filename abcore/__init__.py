@@ -0,0 +1,7 @@
+"""Dependency-free core shared by the API and abclient.
+
+Bucketing, targeting, config snapshots and the background BatchWriter use
+the standard library only (NumPy is imported lazily by the batch helpers),
+so the client SDK can be installed without the server's FastAPI /
+SQLAlchemy stack.
+"""
@@ -0,0 +1,50 @@
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Sequence
+
+BUCKETS = 100
+
+def stable_bucket(user_id: str, experiment_key: str) -> int:
+    h = hashlib.sha256(f"{user_id}:{experiment_key}".encode("utf-8")).hexdigest()
+    return int(h[:8], 16) % BUCKETS
+
+def _bucket_chunk(args):
+    import numpy as np
+
+    user_ids, experiment_key = args
+    suffix = f":{experiment_key}".encode("utf-8")
+    sha256 = hashlib.sha256
+    # first 4 digest bytes == the 8 hex chars stable_bucket parses
+    prefixes = b"".join(sha256(str(u).encode("utf-8") + suffix).digest()[:4] for u in user_ids)
+    return (np.frombuffer(prefixes, dtype=">u4") % BUCKETS).astype(np.uint8)
+
+def stable_buckets(
+    user_ids: Iterable[str],
+    experiment_key: str,
+    workers: int = 1,
+    chunk_size: int = 1_000_000,
+):
+    """Bucket many users at once; element-wise identical to `stable_bucket`.
+
+    Accepts any iterable of IDs (list, NumPy/pandas array) and returns a uint8
+    NumPy array. With `workers > 1` chunks are hashed in a process pool.
+    """
+    import numpy as np
+
+    ids: Sequence[str] = user_ids if hasattr(user_ids, "__len__") else list(user_ids)
+    if len(ids) == 0:
+        return np.empty(0, dtype=np.uint8)
+    chunks = [(ids[i:i + chunk_size], experiment_key) for i in range(0, len(ids), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_bucket_chunk, chunks))
+    else:
+        parts = [_bucket_chunk(c) for c in chunks]
+    return np.concatenate(parts)
+
+def assign_variants(user_ids: Iterable[str], exp, workers: int = 1):
+    """Variants for many users of one experiment via its precompiled lookup table."""
+    import numpy as np
+
+    table = np.asarray(exp.variant_table, dtype=object)
+    return table[stable_buckets(user_ids, exp.key, workers=workers)]
@@ -0,0 +1,100 @@
+"""Experiment config snapshots: compiled allocation tables and targeting.
+
+Built from the parsed config by the API (api/config.py loads the YAML)
+and by abclient from `/config/snapshot`, so both bucket and target users
+identically. Standard library only.
+"""
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
+
+from .targeting import Targeting, compile_targeting
+
+@dataclass(frozen=True)
+class ExperimentCfg:
+    key: str
+    name: str
+    enabled: bool
+    # read-only views (see _freeze): snapshots are shared by every request
+    allocation: Mapping[str, int]
+    targeting: Mapping[str, object]
+    # variant for each of the 100 buckets, built once by load_config
+    variant_table: Tuple[str, ...] = field(default=(), repr=False)
+    eligibility: Targeting = field(default_factory=Targeting, repr=False)
+
+    def variant_for_bucket(self, bucket: int) -> str:
+        return self.variant_table[bucket]
+
+@dataclass(frozen=True)
+class AppConfig:
+    experiments: Mapping[str, ExperimentCfg]
+    # content hash of the YAML the snapshot was built from
+    version: str = ""
+
+def _freeze(value: Any) -> Any:
+    """Deep read-only copy: dicts become MappingProxyType, lists tuples."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+def build_config(raw: Mapping[str, object], version: str) -> AppConfig:
+    """Compile a parsed config ({"experiments": [...]}) into a snapshot.
+
+    Shared by the YAML loader and clients rebuilding `/config/snapshot`,
+    so both bucket and target users identically.
+    """
+    exps: Dict[str, ExperimentCfg] = {}
+    for e in raw.get("experiments", []):
+        allocation = e.get("allocation", {"A": 50, "B": 50})
+        exps[e["key"]] = ExperimentCfg(
+            key=e["key"],
+            name=e.get("name", e["key"]),
+            enabled=bool(e.get("enabled", True)),
+            allocation=_freeze(allocation),
+            targeting=_freeze(e.get("targeting") or {}),
+            variant_table=compile_allocation(e["key"], allocation),
+            eligibility=compile_targeting(e["key"], e.get("targeting")),
+        )
+    return AppConfig(experiments=MappingProxyType(exps), version=version)
+
+def snapshot(cfg: AppConfig) -> Dict[str, object]:
+    """JSON-ready form of a snapshot; `build_config(s, s["version"])` rebuilds it."""
+    return {
+        "version": cfg.version,
+        "experiments": [
+            {"key": e.key, "name": e.name, "enabled": e.enabled,
+             "allocation": _thaw(e.allocation), "targeting": _thaw(e.targeting)}
+            for e in cfg.experiments.values()
+        ],
+    }
+
+def pick_variant_by_bucket(buckets: Dict[str, int], bucket_value: int) -> str:
+    cumulative = 0
+    for variant, pct in buckets.items():
+        if pct < 0:
+            raise ValueError("Allocation percent must be >= 0")
+        cumulative += pct
+        if bucket_value < cumulative:
+            return variant
+    return list(buckets.keys())[-1]
+
+def compile_allocation(experiment_key: str, allocation: Dict[str, int]) -> Tuple[str, ...]:
+    """Validate an allocation and expand it into a 100-slot bucket -> variant table."""
+    if not allocation:
+        raise ValueError(f"{experiment_key}: allocation is empty")
+    for variant, pct in allocation.items():
+        if not isinstance(pct, int) or pct < 0:
+            raise ValueError(f"{experiment_key}: allocation for {variant} must be an int >= 0")
+    total = sum(allocation.values())
+    if total != 100:
+        raise ValueError(f"{experiment_key}: allocation must sum to 100, got {total}")
+    return tuple(pick_variant_by_bucket(allocation, b) for b in range(100))
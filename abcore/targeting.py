@@ -0,0 +1,274 @@
+"""Targeting rules compiled from `ExperimentCfg.targeting` into cheap predicates.
+
+Supported keys (all optional, combined with AND):
+
+    countries / devices: [..]          attribute must be in the list
+    exclude_countries / exclude_devices
+    min_app_version / max_app_version: "1.4.0"
+    new_users_only: true               attribute `new_user` must be true
+    holdout_pct: 10                    deterministic % of users kept out
+    user_ids: [..]                     only these users are eligible
+    allow_user_ids: [..]               always eligible (skips all other rules)
+    deny_user_ids: [..]                never eligible
+    rules:                             generic form, evaluated in order
+      - {attr: plan, op: in, values: [pro, team]}
+      - {attr: app_version, op: gte, value: "2.0"}
+
+`eq`/`neq`/`gt`/`gte`/`lt`/`lte` compare numbers numerically and dotted
+versions ("2.0", and anything on app_version) part by part, padding the
+shorter one with zeros: "3" vs "2.9.1" is (3, 0, 0) vs (2, 9, 1). A bare
+number is compared as a version too when the value is dotted. Any other
+value is a string, compared case-insensitively and only with eq / neq.
+
+Rules on attributes the caller did not send are skipped, so clients that
+don't pass attributes keep being enrolled as before.
+"""
+import operator
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from .bucketing import stable_bucket
+
+Attributes = Mapping[str, Any]
+
+def _norm(value: Any) -> str:
+    if type(value) is str:
+        return value.strip().lower()
+    return str(value).strip().lower()
+
+@lru_cache(maxsize=4096)
+def _parse_version(value: str) -> Tuple[int, ...]:
+    parts = []
+    for p in value.strip().lstrip("vV").split("."):
+        digits = "".join(ch for ch in p if ch.isdigit())
+        parts.append(int(digits) if digits else 0)
+    while parts and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts)
+
+def parse_version(value: Any) -> Tuple[int, ...]:
+    """'2.10.1' -> (2, 10, 1); non-numeric parts count as 0, trailing zeros are dropped.
+
+    App versions are low-cardinality, so parsed values are memoised.
+    """
+    return _parse_version(str(value))
+
+def _pad(a: Tuple[int, ...], b: Tuple[int, ...]) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """Pad the shorter version with zeros so "3" and "2.9.1" compare part by part."""
+    n = max(len(a), len(b))
+    return a + (0,) * (n - len(a)), b + (0,) * (n - len(b))
+
+def _is_version(value: str) -> bool:
+    parts = value.strip().lstrip("vV").split(".")
+    return len(parts) > 1 and all(p[:1].isdigit() for p in parts)
+
+def _threshold(value: Any, version: bool) -> Tuple[str, Any]:
+    """(kind, comparable value): kind is "version", "number" or "string"."""
+    if version or (isinstance(value, str) and _is_version(value)):
+        return "version", parse_version(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "number", float(value)
+    if isinstance(value, str):
+        try:
+            return "number", float(value)
+        except ValueError:
+            pass
+    return "string", _norm(value)
+
+_COMPARE: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+class Rule(ABC):
+    """A compiled predicate; `reason` is reported when it rejects a user."""
+
+    __slots__ = ("attr", "reason")
+
+    def __init__(self, attr: str, reason: str):
+        self.attr = attr
+        self.reason = reason
+
+    @abstractmethod
+    def matches(self, user_id: str, attrs: Attributes) -> bool:
+        """True if the user passes (or the rule does not apply)."""
+
+class InSet(Rule):
+    __slots__ = ("values", "negate")
+
+    def __init__(self, attr: str, values, negate: bool = False):
+        super().__init__(attr, f"{attr} {'excluded' if negate else 'not targeted'}")
+        self.values: FrozenSet[str] = frozenset(_norm(v) for v in values)
+        self.negate = negate
+
+    def matches(self, user_id: str, attrs: Attributes) -> bool:
+        value = attrs.get(self.attr)
+        if value is None:
+            return True
+        return (_norm(value) in self.values) != self.negate
+
+class Compare(Rule):
+    __slots__ = ("op_name", "op", "threshold", "kind")
+
+    def __init__(self, attr: str, op: str, value: Any, version: bool = False):
+        if op not in _COMPARE:
+            raise ValueError(f"unknown targeting op {op!r}")
+        super().__init__(attr, f"{attr} fails {op} {value}")
+        self.op_name = op
+        self.op = _COMPARE[op]
+        self.kind, self.threshold = _threshold(value, version)
+        if self.kind == "string" and op not in ("eq", "neq"):
+            raise ValueError(f"{attr}: {op} needs a number or a version, got {value!r}")
+
+    def matches(self, user_id: str, attrs: Attributes) -> bool:
+        value = attrs.get(self.attr)
+        if value is None:
+            return True
+        if self.kind == "version":
+            return self.op(*_pad(parse_version(value), self.threshold))
+        if self.kind == "number":
+            try:
+                actual = float(value)
+            except (TypeError, ValueError):
+                if isinstance(value, str) and _is_version(value):
+                    # a bare number against a dotted value, e.g. 3 vs "2.9.1"
+                    return self.op(*_pad(parse_version(value), parse_version(self.threshold)))
+                # a value that is not a number is never equal to one
+                return self.op_name == "neq"
+        else:
+            actual = _norm(value)
+        return self.op(actual, self.threshold)
+
+class IsTrue(Rule):
+    __slots__ = ()
+
+    def matches(self, user_id: str, attrs: Attributes) -> bool:
+        value = attrs.get(self.attr)
+        if value is None:
+            return True
+        return value is True or _norm(value) in ("1", "true", "yes")
+
+class Holdout(Rule):
+    __slots__ = ("pct", "salt")
+
+    def __init__(self, experiment_key: str, pct: int):
+        if not 0 <= pct <= 100:
+            raise ValueError(f"{experiment_key}: holdout_pct must be within 0..100")
+        super().__init__("user_id", "holdout")
+        self.pct = pct
+        # separate salt so the holdout is independent of variant buckets
+        self.salt = f"{experiment_key}:holdout"
+
+    def matches(self, user_id: str, attrs: Attributes) -> bool:
+        return stable_bucket(user_id, self.salt) >= self.pct
+
+class Targeting:
+    """All targeting rules of one experiment, evaluated in a fixed cheap-first order."""
+
+    __slots__ = ("allow", "deny", "only", "rules")
+
+    def __init__(
+        self,
+        allow: FrozenSet[str] = frozenset(),
+        deny: FrozenSet[str] = frozenset(),
+        only: Optional[FrozenSet[str]] = None,
+        rules: Tuple[Rule, ...] = (),
+    ):
+        self.allow = allow
+        self.deny = deny
+        self.only = only
+        self.rules = rules
+
+    def __len__(self) -> int:
+        return len(self.rules) + bool(self.allow) + bool(self.deny) + (self.only is not None)
+
+    def evaluate(self, user_id: str, attrs: Attributes) -> Optional[str]:
+        """None if the user is eligible, else the reason they are not."""
+        if user_id in self.allow:
+            return None
+        if user_id in self.deny:
+            return "user denied"
+        if self.only is not None and user_id not in self.only:
+            return "user not targeted"
+        for rule in self.rules:
+            if not rule.matches(user_id, attrs):
+                return rule.reason
+        return None
+
+def compile_targeting(experiment_key: str, spec: Optional[Mapping[str, Any]]) -> Targeting:
+    spec = dict(spec or {})
+    allow = frozenset(str(u) for u in spec.pop("allow_user_ids", []) or [])
+    deny = frozenset(str(u) for u in spec.pop("deny_user_ids", []) or [])
+    only_ids = spec.pop("user_ids", None)
+    only = frozenset(str(u) for u in only_ids) if only_ids is not None else None
+
+    rules: List[Rule] = []
+    for attr, plural in (("country", "countries"), ("device", "devices")):
+        if plural in spec:
+            rules.append(InSet(attr, spec.pop(plural)))
+        if f"exclude_{plural}" in spec:
+            rules.append(InSet(attr, spec.pop(f"exclude_{plural}"), negate=True))
+    if "min_app_version" in spec:
+        rules.append(Compare("app_version", "gte", spec.pop("min_app_version"), version=True))
+    if "max_app_version" in spec:
+        rules.append(Compare("app_version", "lte", spec.pop("max_app_version"), version=True))
+    if spec.pop("new_users_only", False):
+        rules.append(IsTrue("new_user", "not a new user"))
+    for raw in spec.pop("rules", []) or []:
+        attr, op = raw["attr"], raw.get("op", "in")
+        if op in ("in", "not_in"):
+            rules.append(InSet(attr, raw["values"], negate=op == "not_in"))
+        else:
+            rules.append(Compare(attr, op, raw["value"], version=attr == "app_version"))
+    rules = _merge(rules)
+    # hashing is the most expensive check, keep it last
+    holdout = spec.pop("holdout_pct", 0)
+    if holdout:
+        rules.append(Holdout(experiment_key, int(holdout)))
+    if spec:
+        raise ValueError(f"{experiment_key}: unknown targeting keys {sorted(spec)}")
+    return Targeting(allow=allow, deny=deny, only=only, rules=tuple(rules))
+
+def _merge(rules: List[Rule]) -> List[Rule]:
+    """Fold rules on the same attribute so cost grows with attributes, not rules.
+
+    Set rules are intersected (`in`) or unioned (`not_in`); for range rules only
+    the strictest bound per direction is kept. Other rules pass through.
+    """
+    sets: Dict[Tuple[str, bool], InSet] = {}
+    bounds: Dict[Tuple[str, bool, bool], Compare] = {}
+    merged: List[Rule] = []
+    for rule in rules:
+        if isinstance(rule, InSet):
+            prev = sets.get((rule.attr, rule.negate))
+            if prev is None:
+                sets[(rule.attr, rule.negate)] = rule
+                merged.append(rule)
+            elif rule.negate:
+                prev.values = prev.values | rule.values
+            else:
+                prev.values = prev.values & rule.values
+            continue
+        if isinstance(rule, Compare) and rule.op_name in ("gt", "gte", "lt", "lte"):
+            lower = rule.op_name in ("gt", "gte")
+            key = (rule.attr, lower, rule.kind)
+            prev = bounds.get(key)
+            if prev is None:
+                bounds[key] = rule
+                merged.append(rule)
+                continue
+            if rule.threshold == prev.threshold:
+                stricter = rule.op_name in ("gt", "lt")
+            else:
+                stricter = (rule.threshold > prev.threshold) == lower
+            if stricter:
+                prev.op_name, prev.op = rule.op_name, rule.op
+                prev.threshold, prev.reason = rule.threshold, rule.reason
+            continue
+        merged.append(rule)
+    return merged
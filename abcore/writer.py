@@ -0,0 +1,166 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class BatchWriter(Generic[T]):
+    """Background thread that hands queued items to `flush` in batches.
+
+    A batch is flushed when it reaches `max_batch` items or when `interval`
+    seconds have passed since its first item arrived. `max_queue=0` means
+    unbounded; otherwise `submit` returns False once the queue is full so the
+    caller can fall back or push back. `stop` drains whatever is queued.
+
+    A failed flush is retried `retries` times, `backoff` seconds apart and
+    doubling; a batch that still fails is counted as dropped and handed to
+    `on_drop`, so the caller can undo whatever assumed it was stored.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush: Callable[[List[T]], None],
+        max_batch: int = 500,
+        interval: float = 0.2,
+        max_queue: int = 0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        on_drop: Optional[Callable[[List[T]], None]] = None,
+    ):
+        self.name = name
+        self._flush = flush
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._on_drop = on_drop
+        self.max_batch = max(1, max_batch)
+        self.interval = interval
+        self.max_queue = max_queue
+        self._queue: "queue.Queue[T]" = queue.Queue(maxsize=max(0, max_queue))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.submitted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failed = 0  # flush attempts that raised
+        self.dropped = 0  # items given up on after all retries
+        self.last_flush_ms = 0.0
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        # anything submitted after the thread exited
+        self._drain()
+
+    def submit(self, item: T) -> bool:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every submitted item was flushed or dropped, in-flight batch included; False on timeout."""
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queued": self.depth(),
+            "max_queue": self.max_queue,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+        }
+
+    def _next_batch(self) -> List[T]:
+        try:
+            first = self._queue.get(timeout=self.interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[T]) -> None:
+        try:
+            self._write_attempts(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_attempts(self, batch: List[T]) -> None:
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                self._flush(batch)
+            except Exception:
+                self.failed += 1
+                if attempt < self.retries:
+                    delay = self.backoff * 2 ** attempt
+                    log.warning("%s: flush of %d items failed, retrying in %.1fs",
+                                self.name, len(batch), delay, exc_info=True)
+                    time.sleep(delay)
+                    continue
+                self.dropped += len(batch)
+                log.exception("%s: dropping %d items after %d attempts", self.name, len(batch), attempt + 1)
+                if self._on_drop:
+                    try:
+                        self._on_drop(batch)
+                    except Exception:
+                        log.exception("%s: on_drop failed", self.name)
+                return
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self.flushed += len(batch)
+            self.batches += 1
+            return
+
+    def _drain(self) -> None:
+        while True:
+            batch: List[T] = []
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+        self._drain()
@@ -0,0 +1,190 @@
+# analysis/batch.py
+"""Analyze every experiment in one run.
+
+    python -m analysis.batch [--out report.json | report.parquet] [--workers 4]
+                             [--control A] [--alpha 0.05] [--kyc-delta 0.02] [--rope 0.005]
+
+Counts for all experiments come from one query over agg_variant_day_stats.
+The frequentist part (pooled two-proportion z-test, Wilson CIs, KYC
+non-inferiority guardrail) runs as array operations over every
+(experiment, variant) row at once. The Bayesian part (Pr(best), expected
+loss, lift HDI and ROPE vs control; analysis/bayes.py) is split into
+chunks of experiments and fanned out over a process pool with `--workers`.
+
+Every non-control variant is compared with the control arm of its
+experiment (`--control`, falling back to the alphabetically first
+variant), so A/B/n experiments need no special casing.
+"""
+import argparse, json, os, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from . import bayes
+from .data import SCHEMA, load_all_variant_stats
+
+ALPHA = float(os.getenv("ALPHA", "0.05"))
+KYC_DELTA = float(os.getenv("KYC_DELTA", "0.02"))  # B may be at most this much worse on KYC≤7d
+ROPE = float(os.getenv("ROPE", "0.005"))
+
+def wilson_ci(successes, nobs, alpha: float = ALPHA):
+    """Wilson score interval, element-wise (same as statsmodels method="wilson")."""
+    x = np.asarray(successes, dtype=float)
+    n = np.asarray(nobs, dtype=float)
+    z = special.ndtri(1 - alpha / 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = x / n
+        denom = 1 + z * z / n
+        center = (p + z * z / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return center - half, center + half
+
+def ztest(x_t, n_t, x_c, n_c):
+    """Pooled two-proportion z-test of treatment vs control, element-wise; (z, two-sided p)."""
+    x_t, n_t, x_c, n_c = (np.asarray(v, dtype=float) for v in (x_t, n_t, x_c, n_c))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pooled = (x_t + x_c) / (n_t + n_c)
+        se = np.sqrt(pooled * (1 - pooled) * (1 / n_t + 1 / n_c))
+        z = (x_t / n_t - x_c / n_c) / se
+    return z, 2 * special.ndtr(-np.abs(z))
+
+def pick_control(stats: pd.DataFrame, control: str) -> pd.Series:
+    """Control variant per experiment: `control` if present, else the first variant."""
+    first = stats.groupby("experiment_key")["variant"].min()
+    has = stats.loc[stats["variant"] == control, "experiment_key"].unique()
+    return first.where(~first.index.isin(has), control)
+
+def frequentist(stats: pd.DataFrame, controls: pd.Series, alpha: float = ALPHA,
+                kyc_delta: float = KYC_DELTA) -> pd.DataFrame:
+    df = stats[["experiment_key", "variant", "n_users", "n_converted", "n_kyc"]].copy()
+    df["control"] = df["experiment_key"].map(controls)
+    df["is_control"] = df["variant"] == df["control"]
+    df["rate"] = df["n_converted"] / df["n_users"]
+    df["ci_low"], df["ci_high"] = wilson_ci(df["n_converted"], df["n_users"], alpha)
+    df["kyc_rate"] = df["n_kyc"] / df["n_users"]
+
+    ctl = df.loc[df["is_control"], ["experiment_key", "n_users", "n_converted", "rate", "kyc_rate"]]
+    ctl = ctl.set_index("experiment_key").add_prefix("control_")
+    df = df.join(ctl, on="experiment_key")
+    df["lift"] = df["rate"] - df["control_rate"]
+    df["z"], df["p_value"] = ztest(df["n_converted"], df["n_users"],
+                                   df["control_n_converted"], df["control_n_users"])
+    df["kyc_delta"] = df["kyc_rate"] - df["control_kyc_rate"]
+    df["kyc_non_inferior"] = df["kyc_delta"] >= -kyc_delta
+    df["significant"] = df["p_value"] < alpha
+    treatment = ~df["is_control"]
+    df.loc[~treatment, ["lift", "z", "p_value", "kyc_delta"]] = np.nan
+    df.loc[~treatment, ["significant", "kyc_non_inferior"]] = False
+    return df.drop(columns=[c for c in df.columns if c.startswith("control_")])
+
+def _bayes_chunk(args):
+    """Bayesian summaries for a block of experiments (runs in a worker process)."""
+    frame, rope = args
+    out = []
+    # experiments with the same number of arms share one vectorised call
+    for _, group in frame.groupby(frame.groupby("experiment_key")["variant"].transform("size")):
+        group = group.sort_values(["experiment_key", "is_control", "variant"], ascending=[True, False, True])
+        n_exp = group["experiment_key"].nunique()
+        a, b = bayes.posterior_params(group["n_converted"].to_numpy(), group["n_users"].to_numpy())
+        a, b = a.reshape(n_exp, -1), b.reshape(n_exp, -1)
+        best, loss = bayes.best_and_loss(a, b)
+        # column 0 is the control arm; compare every other arm with it
+        arms = a.shape[1]
+        lo = np.full(a.shape, np.nan)
+        hi = np.full(a.shape, np.nan)
+        in_rope = np.full(a.shape, np.nan)
+        if arms > 1:
+            ctl_a = np.repeat(a[:, :1], arms - 1, axis=1).ravel()
+            ctl_b = np.repeat(b[:, :1], arms - 1, axis=1).ravel()
+            lift, mass = bayes.lift_distribution(ctl_a, ctl_b, a[:, 1:].ravel(), b[:, 1:].ravel())
+            low, high = bayes.hdi(lift, mass)
+            lo[:, 1:], hi[:, 1:] = low.reshape(n_exp, -1), high.reshape(n_exp, -1)
+            rope_mass = np.where(np.abs(lift) <= rope, mass, 0.0).sum(axis=-1) / mass.sum(axis=-1)
+            in_rope[:, 1:] = rope_mass.reshape(n_exp, -1)
+        out.append(pd.DataFrame({
+            "experiment_key": group["experiment_key"].to_numpy(),
+            "variant": group["variant"].to_numpy(),
+            "prob_best": best.ravel(),
+            "expected_loss": loss.ravel(),
+            "lift_hdi_low": lo.ravel(),
+            "lift_hdi_high": hi.ravel(),
+            "prob_in_rope": in_rope.ravel(),
+        }))
+    return pd.concat(out, ignore_index=True)
+
+def bayesian(df: pd.DataFrame, rope: float = ROPE, workers: int = 1, chunk_size: int = 64) -> pd.DataFrame:
+    keys = df["experiment_key"].unique()
+    chunks = [(df[df["experiment_key"].isin(keys[i:i + chunk_size])], rope)
+              for i in range(0, len(keys), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_bayes_chunk, chunks))
+    else:
+        parts = [_bayes_chunk(c) for c in chunks]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["experiment_key", "variant"])
+
+def decide(df: pd.DataFrame) -> pd.Series:
+    arms = df.groupby("experiment_key")["variant"].transform("size")
+    return pd.Series(np.select(
+        [arms < 2, df["is_control"], df["significant"] & (df["lift"] > 0) & df["kyc_non_inferior"],
+         df["significant"] & (df["lift"] > 0)],
+        ["insufficient data", "control", "ship", "hold: guardrail"],
+        default="hold",
+    ), index=df.index)
+
+def analyze(stats: pd.DataFrame, control: str = "A", alpha: float = ALPHA, kyc_delta: float = KYC_DELTA,
+            rope: float = ROPE, workers: int = 1) -> pd.DataFrame:
+    """One row per (experiment, variant) with frequentist and Bayesian results and a decision."""
+    stats = stats[stats["n_users"] > 0]
+    controls = pick_control(stats, control)
+    report = frequentist(stats, controls, alpha, kyc_delta)
+    report = report.merge(bayesian(report, rope, workers), on=["experiment_key", "variant"], how="left")
+    report["decision"] = decide(report)
+    return report.sort_values(["experiment_key", "is_control", "variant"], ascending=[True, False, True],
+                              ignore_index=True)
+
+def write_report(report: pd.DataFrame, path: str, params: dict) -> None:
+    if path.endswith(".parquet"):
+        report.to_parquet(path, index=False)
+        return
+    experiments = {
+        key: json.loads(group.drop(columns="experiment_key").to_json(orient="records"))
+        for key, group in report.groupby("experiment_key", sort=True)
+    }
+    with open(path, "w") as f:
+        json.dump({
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "params": params,
+            "experiments": experiments,
+        }, f, indent=2)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", default="analysis_report.json", help=".json or .parquet")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--control", default="A")
+    ap.add_argument("--alpha", type=float, default=ALPHA)
+    ap.add_argument("--kyc-delta", type=float, default=KYC_DELTA)
+    ap.add_argument("--rope", type=float, default=ROPE)
+    args = ap.parse_args()
+
+    started = time.perf_counter()
+    stats = load_all_variant_stats()
+    loaded = time.perf_counter()
+    report = analyze(stats, args.control, args.alpha, args.kyc_delta, args.rope, args.workers)
+    done = time.perf_counter()
+    params = {"schema": SCHEMA, "control": args.control, "alpha": args.alpha,
+              "kyc_delta": args.kyc_delta, "rope": args.rope}
+    write_report(report, args.out, params)
+
+    cols = ["experiment_key", "variant", "n_users", "rate", "lift", "p_value", "prob_best", "decision"]
+    with pd.option_context("display.width", 160, "display.max_rows", 200):
+        print(report[cols].round(4).to_string(index=False))
+    print(f"\n[info] {report['experiment_key'].nunique()} experiments, {len(report)} variants; "
+          f"query {loaded - started:.2f}s, analysis {done - loaded:.2f}s -> {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# analysis/bayes.py
+"""Beta-Binomial A/B/n posteriors evaluated numerically instead of by sampling.
+
+Every arm's Beta posterior is discretised on one shared uniform grid per
+experiment (±GRID_WIDTH posterior sds around the arms, clipped to [0, 1])
+using exact CDF differences, then:
+
+- Pr(arm is best) = ∫ f_k(x) Π_{j≠k} F_j(x) dx, by midpoint quadrature
+- expected loss   = E[max_j p_j] - E[p_k], with E[max] = ∫ 1 - Π_j F_j(x) dx
+- lift B - A      = cross-correlation of the two cell masses (FFT), from which
+                    the HDI, ROPE mass and lift quantiles are read
+
+Inputs broadcast as (experiments, arms), so hundreds of experiments are
+evaluated in a few array operations.
+
+Accuracy (checked by `python -m analysis.bayes --check`): Pr(B>A) is within
+2e-6 of the closed form; ROPE mass, expected loss and HDI bounds agree with
+a 2M-draw Monte Carlo within its sampling error (HDI: two lift-grid steps,
+~0.01 posterior sd each, plus 0.02 sd). The 200k-draw Monte Carlo used
+before had a standard error of up to 1.1e-3 on Pr(B>A).
+"""
+import argparse, sys
+from typing import Dict, Tuple
+
+import numpy as np
+from scipy import signal, special
+
+GRID_SIZE = 2048
+GRID_WIDTH = 10.0
+CHUNK = 256  # experiments per block; caps memory at ~CHUNK × arms × GRID_SIZE floats
+
+def posterior_params(successes, trials, prior_alpha: float = 1.0, prior_beta: float = 1.0):
+    """Beta(alpha + successes, beta + failures) parameters, element-wise."""
+    successes = np.asarray(successes, dtype=float)
+    trials = np.asarray(trials, dtype=float)
+    return prior_alpha + successes, prior_beta + trials - successes
+
+def _grid(a: np.ndarray, b: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-experiment cell edges (E, size + 1) covering all arms; also returns the cell width."""
+    mean = a / (a + b)
+    sd = np.sqrt(a * b / ((a + b) ** 2 * (a + b + 1)))
+    lo = np.clip((mean - GRID_WIDTH * sd).min(axis=-1), 0.0, 1.0)
+    hi = np.clip((mean + GRID_WIDTH * sd).max(axis=-1), 0.0, 1.0)
+    steps = np.linspace(0.0, 1.0, size + 1)
+    edges = lo[:, None] + (hi - lo)[:, None] * steps
+    return edges, (hi - lo) / size
+
+def _discretise(a: np.ndarray, b: np.ndarray, size: int):
+    """Cell masses (E, K, size), CDF at midpoints (E, K, size) and at edges (E, K, size + 1).
+
+    Masses come from Simpson's rule on half-cells using the closed-form log
+    density (far cheaper than the incomplete beta function); only the two
+    boundary half-cells, where the density may be unbounded, and the CDF at
+    the lower edge use the exact incomplete beta.
+    """
+    edges, width = _grid(a, b, size)
+    a3, b3 = a[..., None], b[..., None]
+    fine = edges[:, None, :1] + (edges[:, None, -1:] - edges[:, None, :1]) * np.linspace(0.0, 1.0, 2 * size + 1)
+    half = width[:, None, None] / 2
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        norm = special.betaln(a3, b3)
+        def pdf(x):
+            return np.exp((a3 - 1) * np.log(x) + (b3 - 1) * np.log1p(-x) - norm)
+        cells = half / 6 * (pdf(fine[..., :-1]) + 4 * pdf(fine[..., :-1] + half / 2) + pdf(fine[..., 1:]))
+    ends = special.betainc(a3, b3, fine[..., [0, 1, -2, -1]])
+    cells[..., 0] = ends[..., 1] - ends[..., 0]
+    cells[..., -1] = ends[..., 3] - ends[..., 2]
+    cum = np.concatenate([ends[..., :1], ends[..., :1] + np.cumsum(cells, axis=-1)], axis=-1)
+    mass = cells[..., 0::2] + cells[..., 1::2]
+    return edges, width, mass, cum[..., 1::2], cum[..., 0::2]
+
+def _prod_others(cdf: np.ndarray) -> np.ndarray:
+    """Π_{j≠k} F_j for every k, without dividing by a possibly-zero F_k."""
+    k = cdf.shape[1]
+    out = np.empty_like(cdf)
+    for i in range(k):
+        out[:, i] = np.prod(np.delete(cdf, i, axis=1), axis=1) if k > 1 else 1.0
+    return out
+
+def _arms(a, b) -> Tuple[np.ndarray, np.ndarray]:
+    a = np.atleast_2d(np.asarray(a, dtype=float))
+    b = np.atleast_2d(np.asarray(b, dtype=float))
+    return np.broadcast_arrays(a, b)
+
+def best_and_loss(a, b, grid_size: int = GRID_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """`prob_best` and `expected_loss` from one discretisation, each (experiments, arms)."""
+    a, b = _arms(a, b)
+    best, loss = np.empty(a.shape), np.empty(a.shape)
+    for s in range(0, a.shape[0], CHUNK):
+        ca, cb = a[s:s + CHUNK], b[s:s + CHUNK]
+        edges, width, mass, cdf_mids, cdf_edges = _discretise(ca, cb, grid_size)
+        best[s:s + CHUNK] = (mass * _prod_others(cdf_mids)).sum(axis=-1)
+        tail = 1.0 - np.prod(cdf_edges, axis=1)
+        e_max = edges[:, 0] + width * (tail[:, :-1] + tail[:, 1:]).sum(axis=-1) / 2
+        loss[s:s + CHUNK] = e_max[:, None] - ca / (ca + cb)
+    return best, loss
+
+def prob_best(a, b, grid_size: int = GRID_SIZE) -> np.ndarray:
+    """Pr(arm k has the highest rate), shape (experiments, arms)."""
+    return best_and_loss(a, b, grid_size)[0]
+
+def expected_loss(a, b, grid_size: int = GRID_SIZE) -> np.ndarray:
+    """E[max_j p_j - p_k]: expected rate given up by shipping arm k, shape (experiments, arms)."""
+    return best_and_loss(a, b, grid_size)[1]
+
+def lift_distribution(a_a, b_a, a_b, b_b, grid_size: int = GRID_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Discretised distribution of p_B - p_A for each experiment.
+
+    Returns `(lift, mass)`, both (experiments, 2 * grid_size - 1): lattice
+    points and their probability mass (divide by the step for a density).
+    """
+    a, b = _arms(np.stack(np.broadcast_arrays(a_a, a_b), axis=-1), np.stack(np.broadcast_arrays(b_a, b_b), axis=-1))
+    lifts, masses = [], []
+    for s in range(0, a.shape[0], CHUNK):
+        _, width, mass, _, _ = _discretise(a[s:s + CHUNK], b[s:s + CHUNK], grid_size)
+        # mass_D[k] = Σ_i mass_B[i + k] · mass_A[i]
+        pmf = signal.fftconvolve(mass[:, 1], mass[:, 0, ::-1], mode="full", axes=-1)
+        steps = np.arange(-(grid_size - 1), grid_size)
+        lifts.append(width[:, None] * steps)
+        masses.append(np.clip(pmf, 0.0, None))
+    return np.concatenate(lifts), np.concatenate(masses)
+
+def lift_density(a_a: float, b_a: float, a_b: float, b_b: float, tail: float = 1e-9):
+    """(x, density) of p_B - p_A for one experiment, trimmed to where the density matters; for plots."""
+    lift, mass = lift_distribution(a_a, b_a, a_b, b_b)
+    x, m = lift[0], mass[0]
+    keep = m > tail * m.max()
+    return x[keep], m[keep] / (x[1] - x[0])
+
+def hdi(lift: np.ndarray, mass: np.ndarray, cred: float = 0.95) -> Tuple[np.ndarray, np.ndarray]:
+    """Highest-density interval of a discretised unimodal distribution, per row."""
+    order = np.argsort(-mass, axis=-1)
+    cum = np.cumsum(np.take_along_axis(mass, order, axis=-1), axis=-1)
+    # keep the densest points until `cred` is covered (inclusive of the crossing point)
+    keep_sorted = np.concatenate([np.ones_like(cum[:, :1], dtype=bool), cum[:, :-1] < cred * cum[:, -1:]], axis=-1)
+    keep = np.zeros_like(keep_sorted)
+    np.put_along_axis(keep, order, keep_sorted, axis=-1)
+    lo = np.where(keep, lift, np.inf).min(axis=-1)
+    hi = np.where(keep, lift, -np.inf).max(axis=-1)
+    return lo, hi
+
+def compare(a_a, b_a, a_b, b_b, rope: float = 0.0, cred: float = 0.95,
+            grid_size: int = GRID_SIZE) -> Dict[str, np.ndarray]:
+    """Two-arm summary (B vs A) for one or many experiments; every value is an array."""
+    a = np.stack(np.broadcast_arrays(*map(np.asarray, (a_a, a_b))), axis=-1)
+    b = np.stack(np.broadcast_arrays(*map(np.asarray, (b_a, b_b))), axis=-1)
+    best, loss = best_and_loss(a, b, grid_size)
+    lift, mass = lift_distribution(a_a, b_a, a_b, b_b, grid_size)
+    lo, hi = hdi(lift, mass, cred)
+    total = mass.sum(axis=-1)
+    return {
+        "prob_b_better": best[:, 1],
+        "lift_mean": (lift * mass).sum(axis=-1) / total,
+        "hdi_low": lo,
+        "hdi_high": hi,
+        "prob_in_rope": np.where(np.abs(lift) <= rope, mass, 0.0).sum(axis=-1) / total,
+        "loss_a": loss[:, 0],
+        "loss_b": loss[:, 1],
+    }
+
+def prob_b_beats_a_exact(a_a: float, b_a: float, a_b: float, b_b: float) -> float:
+    """Closed form for integer a_b (Evan Miller); used to validate the quadrature."""
+    i = np.arange(int(a_b))
+    terms = (special.betaln(a_a + i, b_a + b_b) - np.log(b_b + i)
+             - special.betaln(1 + i, b_b) - special.betaln(a_a, b_a))
+    return float(np.exp(terms).sum())
+
+def monte_carlo(a_a, b_a, a_b, b_b, rope: float = 0.0, cred: float = 0.95,
+                draws: int = 200_000, seed: int = 42) -> Dict[str, float]:
+    """The sampling estimator this module replaces, kept as a reference."""
+    rng = np.random.default_rng(seed)
+    lift = np.sort(rng.beta(a_b, b_b, draws) - rng.beta(a_a, b_a, draws))
+    k = int(np.floor(cred * draws))
+    i = int(np.argmin(lift[k:] - lift[:draws - k]))
+    return {
+        "prob_b_better": float((lift > 0).mean()),
+        "lift_mean": float(lift.mean()),
+        "hdi_low": float(lift[i]),
+        "hdi_high": float(lift[i + k]),
+        "prob_in_rope": float((np.abs(lift) <= rope).mean()),
+        "loss_a": float(np.maximum(lift, 0).mean()),
+        "loss_b": float(np.maximum(-lift, 0).mean()),
+    }
+
+def check(cases: int = 20, draws: int = 2_000_000, seed: int = 7) -> bool:
+    """Compare against the closed form and a large Monte Carlo on random posteriors."""
+    rng = np.random.default_rng(seed)
+    n = rng.integers(20, 50_000, size=(cases, 2))
+    p = rng.uniform(0.02, 0.9, size=cases)[:, None] + rng.normal(0, 0.01, size=(cases, 2))
+    a, b = posterior_params(rng.binomial(n, np.clip(p, 0.001, 0.999)), n)
+    rope = 0.005
+    res = compare(a[:, 0], b[:, 0], a[:, 1], b[:, 1], rope=rope)
+    ok = True
+    for e in range(cases):
+        exact = prob_b_beats_a_exact(a[e, 0], b[e, 0], a[e, 1], b[e, 1])
+        mc = monte_carlo(a[e, 0], b[e, 0], a[e, 1], b[e, 1], rope=rope, draws=draws, seed=seed + e)
+        sd = np.sqrt(sum(x * y / ((x + y) ** 2 * (x + y + 1)) for x, y in zip(a[e], b[e])))
+        step = GRID_WIDTH * 2 * sd / GRID_SIZE
+        # tolerances: closed form exact; MC at ~5 standard errors; HDI one grid step + MC noise
+        prob_se = 5 * np.sqrt(0.25 / draws)
+        errors = {
+            "prob_b_better": (abs(res["prob_b_better"][e] - exact), 2e-6),
+            "prob_in_rope": (abs(res["prob_in_rope"][e] - mc["prob_in_rope"]), prob_se),
+            "loss_a": (abs(res["loss_a"][e] - mc["loss_a"]), 5 * sd / np.sqrt(draws)),
+            "loss_b": (abs(res["loss_b"][e] - mc["loss_b"]), 5 * sd / np.sqrt(draws)),
+            "hdi_low": (abs(res["hdi_low"][e] - mc["hdi_low"]), 2 * step + 0.02 * sd),
+            "hdi_high": (abs(res["hdi_high"][e] - mc["hdi_high"]), 2 * step + 0.02 * sd),
+        }
+        failed = {k: v for k, v in errors.items() if v[0] > v[1]}
+        ok &= not failed
+        print(f"[{'ok' if not failed else 'FAIL'}] n={n[e].tolist()} "
+              + " ".join(f"{k}={err:.2e}/{tol:.1e}" for k, (err, tol) in errors.items()))
+    return ok
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Numerical Beta-Binomial engine")
+    ap.add_argument("--check", action="store_true", help="validate against closed form and Monte Carlo")
+    ap.add_argument("--cases", type=int, default=20)
+    args = ap.parse_args()
+    if args.check:
+        sys.exit(0 if check(args.cases) else 1)
+    ap.print_help()
@@ -0,0 +1,253 @@
+# analysis/bootstrap.py
+"""Poisson-bootstrap CIs for continuous per-user metrics.
+
+    python -m analysis.bootstrap [--experiment KEY] [--metric hours_to_kyc]
+                                 [--replicates 1000] [--workers 4] [--seed 7]
+                                 [--chunk 200000] [--bins 1024] [--control A] [--alpha 0.05]
+                                 [--out bootstrap.json | bootstrap.parquet]
+
+Metrics like hours from exposure to first KYC or events per user
+(`USER_METRICS` in analysis/data.py) have no closed-form interval for a
+difference in medians, and their skew makes normal intervals on means
+unreliable. Per-user rows are streamed from fct_conversions `--chunk` at
+a time. In every replicate each user gets an independent Poisson(1)
+weight. This approximates resampling n users with replacement without
+knowing n up front, so chunks can be resampled separately and their
+results added.
+
+For each variant and replicate only sufficient statistics are kept: the
+weighted count and sum (for the mean) and a weighted histogram over
+`--bins` bins (for the median, read by linear interpolation within its
+bin). Bins are equally spaced in asinh(x / scale) between the metric's
+min and max, with scale a thousandth of its median magnitude (one
+ordered-set aggregate): linear near zero, logarithmic beyond, so each
+bin is a fixed small share of its values (~1.6% with 1024 bins and a
+1e4 max-to-median ratio). Equal-width bins put nearly all of them in the
+empty tail of a skewed metric with one far outlier. Memory is
+O(replicates × bins) per variant plus one chunk, whatever the number of
+users. Chunks are resampled in a process pool (`--workers`). Each chunk
+draws its weights from its own SeedSequence(seed, spawn_key=(chunk,)),
+and results are added in chunk order, so a given seed and chunk size
+reproduce the same intervals for any worker count.
+"""
+import argparse, math, os, sys, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .batch import ALPHA, write_report
+from .data import SCHEMA, USER_METRICS, Backend, iter_metric_rows, load_metric_scale, load_metric_summary
+
+SEED = int(os.getenv("BOOTSTRAP_SEED", "7"))
+# asinh bins are linear below this share of the median magnitude and logarithmic above it
+SCALE_SHARE = 1e-3
+BLOCK = 8192  # rows per weight matrix: caps it at BLOCK × replicates bytes
+
+# Poisson(1) weights by inverse CDF over 16-bit uniforms: ~7x faster than rng.poisson, and
+# every probability is right to 2**-16 (weights above 8 are cut off, P = 1e-6)
+_CDF = np.cumsum([math.exp(-1) / math.factorial(k) for k in range(16)])
+POISSON_TABLE = np.searchsorted(np.round(_CDF * 2**16), np.arange(2**16), side="right").astype(np.uint8)
+
+# per variant × replicate: weighted counts, weighted sums, weighted histograms (…, bins)
+Stats = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+def _resample_chunk(args) -> Stats:
+    """Weighted counts, sums and histograms of one chunk for every replicate (runs in a worker)."""
+    k, codes, values, n_variants, edges, replicates, seed = args
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(k,)))
+    bins = len(edges) - 1
+    count = np.zeros((n_variants, replicates))
+    total = np.zeros((n_variants, replicates))
+    hist = np.zeros((n_variants, replicates, bins), dtype=np.int64)
+    cells = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, bins - 1)
+    for lo in range(0, len(values), BLOCK):
+        hi = min(lo + BLOCK, len(values))
+        # one draw per row and replicate, in row order: independent of how variants split the block
+        weights = POISSON_TABLE[rng.integers(0, 2**16, (hi - lo, replicates), dtype=np.uint16)]
+        c, x, b = codes[lo:hi], values[lo:hi], cells[lo:hi]
+        for v in range(n_variants):
+            mask = c == v
+            if not mask.any():
+                continue
+            w = weights[mask]
+            count[v] += w.sum(axis=0, dtype=np.int64)
+            total[v] += x[mask] @ w.astype(np.float64)
+            # histogram: sum the weight rows of each occupied bin
+            order = np.argsort(b[mask], kind="stable")
+            sorted_bins = b[mask][order]
+            starts = np.flatnonzero(np.r_[True, sorted_bins[1:] != sorted_bins[:-1]])
+            hist[v][:, sorted_bins[starts]] += np.add.reduceat(w[order], starts, axis=0, dtype=np.int64).T
+    return count, total, hist
+
+def hist_median(hist: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Median from weighted counts over bins (last axis), interpolated within its bin; NaN if empty."""
+    cum = np.cumsum(hist, axis=-1)
+    half = cum[..., -1] / 2
+    i = np.minimum((cum < half[..., None]).sum(axis=-1), hist.shape[-1] - 1)
+    in_bin = np.take_along_axis(hist, i[..., None], -1)[..., 0]
+    below = np.take_along_axis(cum, i[..., None], -1)[..., 0] - in_bin
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = np.where(in_bin > 0, (half - below) / in_bin, 0.0)
+    median = edges[i] + frac * (edges[i + 1] - edges[i])
+    return np.where(cum[..., -1] > 0, median, np.nan)
+
+def asinh_edges(lo: float, hi: float, scale: Optional[float], bins: int) -> np.ndarray:
+    """`bins` + 1 edges from lo to hi, equally spaced in asinh(x / s) with s = SCALE_SHARE × scale."""
+    s = SCALE_SHARE * scale if scale else SCALE_SHARE * max(abs(lo), abs(hi), 1.0)
+    edges = s * np.sinh(np.linspace(np.arcsinh(lo / s), np.arcsinh(hi / s), bins + 1))
+    edges[0], edges[-1] = lo, hi
+    return edges
+
+def bootstrap(experiment: str, metric: str, replicates: int = 1000, workers: int = 1, seed: int = SEED,
+              chunk: int = 200_000, bins: int = 1024, engine: Optional[Backend] = None):
+    """Stream the metric and resample it; returns (variants, edges, observed Stats, replicate Stats).
+
+    Observed stats are the unweighted ones, shaped (variants,) and (variants, bins).
+    """
+    summary = load_metric_summary(experiment, metric, engine)
+    summary = summary[summary["n"] > 0]
+    variants = summary["variant"].tolist()
+    lo, hi = (float(summary["min"].min()), float(summary["max"].max())) if variants else (0.0, 1.0)
+    scale = load_metric_scale(experiment, metric, engine) if variants else None
+    edges = asinh_edges(lo, hi if hi > lo else lo + 1.0, scale, bins)
+    n_variants = len(variants)
+    observed = (np.zeros(n_variants), np.zeros(n_variants), np.zeros((n_variants, bins), dtype=np.int64))
+    acc = (np.zeros((n_variants, replicates)), np.zeros((n_variants, replicates)),
+           np.zeros((n_variants, replicates, bins), dtype=np.int64))
+
+    def add(part: Stats) -> None:
+        for a, p in zip(acc, part):
+            a += p
+
+    def tasks():
+        for k, (names, values) in enumerate(iter_metric_rows(experiment, metric, chunk, engine)):
+            codes = pd.Categorical(names, categories=variants).codes.astype(np.int64)
+            # a variant that appeared after the summary query is left out
+            keep = codes >= 0
+            codes, values = codes[keep], values[keep]
+            cells = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, bins - 1)
+            observed[0][:] += np.bincount(codes, minlength=n_variants)
+            observed[1][:] += np.bincount(codes, weights=values, minlength=n_variants)
+            observed[2][:] += np.bincount(codes * bins + cells, minlength=n_variants * bins).reshape(n_variants, bins)
+            yield k, codes, values, n_variants, edges, replicates, seed
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # bounded read-ahead; results are added in chunk order
+            pending = deque()
+            for task in tasks():
+                pending.append(pool.submit(_resample_chunk, task))
+                if len(pending) >= 2 * workers:
+                    add(pending.popleft().result())
+            while pending:
+                add(pending.popleft().result())
+    else:
+        for task in tasks():
+            add(_resample_chunk(task))
+    return variants, edges, observed, acc
+
+def summarize(variants, edges, observed: Stats, replicates: Stats, control: str = "A",
+              alpha: float = ALPHA) -> pd.DataFrame:
+    """Per variant: mean and median with percentile CIs, and their differences from control."""
+    if not variants:
+        return pd.DataFrame(columns=["variant", "n", "mean", "median"])
+    q = [alpha / 2, 1 - alpha / 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = replicates[1] / replicates[0]                   # (variants, replicates)
+        mean = observed[1] / observed[0]
+    medians = hist_median(replicates[2], edges)
+    median = hist_median(observed[2], edges)
+    ctl = variants.index(control) if control in variants else 0
+
+    df = pd.DataFrame({"variant": variants, "n": observed[0].astype(np.int64), "is_control": False})
+    df.loc[ctl, "is_control"] = True
+    df["mean"] = mean
+    df["mean_ci_low"], df["mean_ci_high"] = np.nanquantile(means, q, axis=1)
+    df["median"] = median
+    df["median_ci_low"], df["median_ci_high"] = np.nanquantile(medians, q, axis=1)
+    for stat, point, reps in (("mean", mean, means), ("median", median, medians)):
+        diff = reps - reps[ctl]
+        df[f"diff_{stat}"] = point - point[ctl]
+        df[f"diff_{stat}_ci_low"], df[f"diff_{stat}_ci_high"] = np.nanquantile(diff, q, axis=1)
+        # share of replicates on the other side of zero, two-sided
+        df[f"diff_{stat}_p"] = np.minimum(1.0, 2 * np.minimum((diff <= 0).mean(axis=1), (diff >= 0).mean(axis=1)))
+    diffs = [c for c in df.columns if c.startswith("diff_")]
+    df.loc[ctl, diffs] = np.nan
+    return df
+
+def check(users: int = 60_000, replicates: int = 400, seed: int = SEED) -> bool:
+    """Skewed hours_to_kyc with one far outlier: medians and their difference against the exact ones."""
+    import duckdb
+
+    rng = np.random.default_rng(seed)
+    variants = np.repeat(["A", "B"], users // 2)
+    # lognormal hours (B about 0.3 h slower at the median) and one user stuck for 20,000 h
+    hours = rng.lognormal(np.log(np.where(variants == "A", 2.7, 3.0)), 1.0)
+    hours[0] = 20_000.0
+    con = duckdb.connect()
+    con.execute(f"create schema {SCHEMA}")
+    con.execute(f"create table {SCHEMA}.fct_conversions (experiment_key text, user_id text, variant text, "
+                "hours_to_kyc double, hours_to_complete double, n_events bigint)")
+    con.register("check_rows", pd.DataFrame({
+        "experiment_key": "check", "user_id": [f"u{i:06d}" for i in range(users)],
+        "variant": variants, "hours_to_kyc": hours, "hours_to_complete": None, "n_events": 1,
+    }))
+    con.execute(f"insert into {SCHEMA}.fct_conversions select * from check_rows")
+
+    report = summarize(*bootstrap("check", "hours_to_kyc", replicates, seed=seed, chunk=25_000, engine=con))
+    exact = [np.median(hours[variants == v]) for v in ("A", "B")]
+    b = report.set_index("variant").loc["B"]
+    diff = exact[1] - exact[0]
+    ok = True
+    # tolerances: 1% of each median (the old equal-width bins were off by ~270%)
+    for name, value, target, tol in (("median A", report["median"][0], exact[0], 0.01 * exact[0]),
+                                     ("median B", report["median"][1], exact[1], 0.01 * exact[1]),
+                                     ("diff_median", b["diff_median"], diff, 0.02)):
+        good = abs(value - target) <= tol
+        ok &= good
+        print(f"[{'ok' if good else 'FAIL'}] {name}={value:.4f} exact={target:.4f} tol={tol:.1e}")
+    covered = b["diff_median_ci_low"] <= diff <= b["diff_median_ci_high"]
+    ok &= covered
+    print(f"[{'ok' if covered else 'FAIL'}] diff_median CI [{b['diff_median_ci_low']:.4f}, "
+          f"{b['diff_median_ci_high']:.4f}] covers {diff:.4f}")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--experiment", default=os.getenv("EXPERIMENT", "onboarding_progressive_v1"))
+    ap.add_argument("--metric", choices=USER_METRICS, default="hours_to_kyc")
+    ap.add_argument("--replicates", type=int, default=1000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("--chunk", type=int, default=200_000, help="users per streamed / resampled chunk")
+    ap.add_argument("--bins", type=int, default=1024, help="asinh-spaced histogram bins for the median")
+    ap.add_argument("--control", default="A")
+    ap.add_argument("--alpha", type=float, default=ALPHA)
+    ap.add_argument("--out", default=None, help=".json or .parquet")
+    ap.add_argument("--check", action="store_true", help="validate medians on a skewed metric with an outlier")
+    args = ap.parse_args()
+    if args.check:
+        sys.exit(0 if check(seed=args.seed) else 1)
+
+    started = time.perf_counter()
+    variants, edges, observed, reps = bootstrap(args.experiment, args.metric, args.replicates, args.workers,
+                                                args.seed, args.chunk, args.bins)
+    report = summarize(variants, edges, observed, reps, args.control, args.alpha)
+    elapsed = time.perf_counter() - started
+    if args.out:
+        params = {"schema": SCHEMA, "metric": args.metric, "replicates": args.replicates, "seed": args.seed,
+                  "chunk": args.chunk, "bins": args.bins, "control": args.control, "alpha": args.alpha}
+        write_report(report.assign(experiment_key=args.experiment), args.out, params)
+
+    print(f"=== {args.experiment}: {args.metric}, {args.replicates} Poisson-bootstrap replicates, "
+          f"{1 - args.alpha:.0%} percentile CIs ===")
+    with pd.option_context("display.width", 200, "display.max_columns", 30):
+        print(report.round(4).to_string(index=False))
+    print(f"\n[info] {int(report['n'].sum()) if len(report) else 0:,} users in {elapsed:.2f}s"
+          + (f" -> {args.out}" if args.out else ""))
+
+if __name__ == "__main__":
+    main()
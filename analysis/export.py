@@ -0,0 +1,157 @@
+# analysis/export.py
+"""Export the marts (and optionally raw events) to Parquet snapshots.
+
+    python -m analysis.export --out snapshot [--events] [--events-since 2024-01-01]
+
+Each table becomes a hive-partitioned Parquet dataset under `--out`:
+
+    snapshot/fct_conversions/experiment_key=<key>/part-<n>.parquet
+    snapshot/events_raw/experiment_key=<key>/day=<yyyy-mm-dd>/part-<n>.parquet
+
+Rows are streamed from a server-side cursor `--chunk` at a time, so the
+export needs memory for one chunk and puts one sequential scan per table
+on Postgres. Every export of a table is written to a new hidden version
+directory (`.<table>.<n>`), and `<table>` is a symlink re-pointed with one
+atomic rename when the version is complete. Readers therefore see the
+old or the new snapshot of a table, never a partial or missing one. The
+previous version is kept for scans still reading it; older versions are
+removed. With ANALYSIS_SNAPSHOT pointing at `--out`,
+analysis/data.py reads the snapshot through DuckDB instead of Postgres.
+"""
+import argparse, json, os, shutil, time
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+
+from .data import SCHEMA, get_postgres_engine
+
+# (source relation, partition columns)
+TABLES: Dict[str, Tuple[str, List[str]]] = {
+    "fct_exposures": (f"{SCHEMA}.fct_exposures", ["experiment_key"]),
+    "fct_conversions": (f"{SCHEMA}.fct_conversions", ["experiment_key"]),
+    "agg_variant_day_stats": (f"{SCHEMA}.agg_variant_day_stats", ["experiment_key"]),
+    "agg_segment_stats": (f"{SCHEMA}.agg_segment_stats", ["experiment_key"]),
+    "agg_experiment_funnel": (f"{SCHEMA}.agg_experiment_funnel", ["experiment_key"]),
+    "dbt_runs": (f"{SCHEMA}.dbt_runs", []),
+}
+# events_raw stores dictionary ids (sql/init.sql); the snapshot keeps the names
+EVENTS = ("""
+    select e.id, e.ts, e.user_id, x.key as experiment_key, v.name as variant, t.name as event_type,
+           e.metadata, (e.ts at time zone 'UTC')::date::text as day
+    from public.events_raw e
+    join public.experiments x on x.id = e.experiment_id
+    join public.variants v on v.id = e.variant_id
+    join public.event_types t on t.id = e.event_type_id""", ["experiment_key", "day"])
+
+# Postgres type OID -> (Arrow type, converter for driver values)
+_json = lambda v: v if v is None or isinstance(v, str) else json.dumps(v)  # noqa: E731
+_float = lambda v: float(v) if isinstance(v, Decimal) else v  # noqa: E731
+_str = lambda v: None if v is None else str(v)  # noqa: E731  any other type, as text
+PG_TYPES: Dict[int, Tuple[pa.DataType, Optional[Callable]]] = {
+    16: (pa.bool_(), None),
+    20: (pa.int64(), None), 21: (pa.int16(), None), 23: (pa.int32(), None),
+    700: (pa.float32(), None), 701: (pa.float64(), None), 1700: (pa.float64(), _float),
+    25: (pa.string(), None), 1043: (pa.string(), None), 19: (pa.string(), None),
+    1082: (pa.date32(), None),
+    1114: (pa.timestamp("us"), None), 1184: (pa.timestamp("us", tz="UTC"), None),
+    114: (pa.string(), _json), 3802: (pa.string(), _json),
+}
+
+def _schema(description) -> Tuple[pa.Schema, List[Optional[Callable]]]:
+    fields, converters = [], []
+    for col in description:
+        arrow_type, conv = PG_TYPES.get(col.type_code, (pa.string(), _str))
+        fields.append(pa.field(col.name, arrow_type))
+        converters.append(conv)
+    return pa.schema(fields), converters
+
+def _to_table(rows, schema: pa.Schema, converters) -> pa.Table:
+    columns = list(zip(*rows))
+    arrays = [
+        pa.array([conv(v) for v in col] if conv else col, type=field.type)
+        for col, field, conv in zip(columns, schema, converters)
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def export_table(name: str, sql: str, partitioning: List[str], out: Path, chunk: int,
+                 params: Optional[dict] = None) -> int:
+    """Stream `sql` into a new version of the dataset `out/name` and swap it in; returns the number of rows."""
+    tmp = out / f".{name}.{time.time_ns()}"
+    tmp.mkdir(parents=True)
+    try:
+        rows_written = _write_version(name, sql, partitioning, tmp, chunk, params)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    _swap_in(name, tmp, out)
+    return rows_written
+
+def _write_version(name: str, sql: str, partitioning: List[str], tmp: Path, chunk: int,
+                   params: Optional[dict]) -> int:
+    rows_written = 0
+    with get_postgres_engine().connect() as con:
+        # named cursor = server-side: Postgres hands out `chunk` rows at a time
+        with con.connection.driver_connection.cursor(name=f"export_{name}") as cur:
+            cur.itersize = chunk
+            cur.execute(sql, params)
+            schema, converters = _schema(cur.description)
+            part = 0
+            while True:
+                rows = cur.fetchmany(chunk)
+                if not rows:
+                    break
+                pads.write_dataset(
+                    _to_table(rows, schema, converters), tmp, format="parquet",
+                    partitioning=partitioning or None, partitioning_flavor="hive" if partitioning else None,
+                    basename_template=f"part-{part:05d}-{{i}}.parquet",
+                    existing_data_behavior="overwrite_or_ignore",
+                )
+                rows_written += len(rows)
+                part += 1
+    if not rows_written:
+        # keep the columns readable for an empty table
+        pq.write_table(schema.empty_table(), tmp / "part-00000-0.parquet")
+    return rows_written
+
+def _swap_in(name: str, version: Path, out: Path) -> None:
+    """Point the `out/name` symlink at `version` with one rename; keep only the previous version."""
+    target = out / name
+    if target.is_dir() and not target.is_symlink():
+        # a snapshot written before versioned exports: moved aside once, not atomically
+        target.rename(out / f".{name}.0")
+    link = out / f".{name}.link"
+    link.unlink(missing_ok=True)
+    link.symlink_to(version.name, target_is_directory=True)
+    os.replace(link, target)
+    versions = sorted((p for p in out.glob(f".{name}.*") if p.name.rsplit(".", 1)[1].isdigit()),
+                      key=lambda p: int(p.name.rsplit(".", 1)[1]))
+    for stale in versions[:-2]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", default="snapshot")
+    ap.add_argument("--tables", nargs="+", choices=sorted(TABLES), default=sorted(TABLES))
+    ap.add_argument("--events", action="store_true", help="also export events_raw, partitioned by day")
+    ap.add_argument("--events-since", default=None, help="only events with ts >= this (prunes partitions)")
+    ap.add_argument("--chunk", type=int, default=200_000, help="rows per fetch / written batch")
+    args = ap.parse_args()
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    jobs = [(name, f"select * from {TABLES[name][0]}", TABLES[name][1], None) for name in args.tables]
+    if args.events:
+        where = "where e.ts >= %(since)s::timestamptz" if args.events_since else ""
+        jobs.append(("events_raw", f"{EVENTS[0]} {where}", EVENTS[1], {"since": args.events_since}))
+    for name, sql, partitioning, params in jobs:
+        started = time.perf_counter()
+        n = export_table(name, sql, partitioning, out, args.chunk, params)
+        print(f"{name:<24} {n:>12,} rows  {time.perf_counter() - started:>7.2f}s")
+    print(f"[info] snapshot -> {out}/")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# analysis/segments.py
+"""Segment breakdown: every variant vs control within every segment.
+
+    python -m analysis.segments [--experiment KEY] [--keys device country]
+                                [--out segments.json | segments.parquet]
+                                [--control A] [--alpha 0.05] [--kyc-delta 0.02]
+
+Reads `agg_segment_stats` (sufficient statistics per experiment × segment
+key × value × variant, built by dbt from the metadata keys in var
+segment_keys) with one grouped query, then runs the same frequentist
+readout as analysis/batch.py (Wilson CIs, pooled z-test, KYC
+non-inferiority guardrail) over all segments at once: each (experiment,
+segment key, value) is one group of the vectorised pass, so a drill-down
+over every segment costs about what the overall readout does.
+
+Slicing one experiment into many segments multiplies the comparisons, so
+p-values are Benjamini-Hochberg adjusted within each experiment × segment
+key and `significant` uses the adjusted value.
+"""
+import argparse, time
+
+import pandas as pd
+
+from .batch import ALPHA, KYC_DELTA, decide, frequentist, pick_control, write_report
+from .data import SCHEMA, load_segment_stats
+
+GROUP = ["experiment_key", "segment_key", "segment_value"]
+
+def bh_adjust(p_values: pd.Series, groups: pd.Series) -> pd.Series:
+    """Benjamini-Hochberg q-values within each group; NaN p-values stay NaN."""
+    df = pd.DataFrame({"p": p_values, "g": groups}).dropna(subset=["p"])
+    df = df.sort_values(["g", "p"], ascending=[True, False])
+    m = df.groupby("g")["p"].transform("size")
+    # descending p: rank from the top is m, m-1, ...
+    rank = m - df.groupby("g").cumcount()
+    q = (df["p"] * m / rank).clip(upper=1.0)
+    q = q.groupby(df["g"]).cummin()
+    return q.reindex(p_values.index)
+
+def analyze(stats: pd.DataFrame, control: str = "A", alpha: float = ALPHA,
+            kyc_delta: float = KYC_DELTA) -> pd.DataFrame:
+    """One row per (experiment, segment key, segment value, variant) with the batch readout."""
+    stats = stats[stats["n_users"] > 0].reset_index(drop=True)
+    # batch.frequentist compares arms within `experiment_key`; feed it one code per segment group
+    codes = stats.groupby(GROUP, sort=False).ngroup()
+    grouped = stats.assign(experiment_key=codes)
+    report = frequentist(grouped, pick_control(grouped, control), alpha, kyc_delta)
+    report["p_adjusted"] = bh_adjust(report["p_value"], stats["experiment_key"] + "|" + stats["segment_key"])
+    report["significant"] = report["p_adjusted"] < alpha
+    report["decision"] = decide(report)
+    report[GROUP] = stats[GROUP]
+    cols = GROUP + [c for c in report.columns if c not in GROUP]
+    return report[cols].sort_values(GROUP + ["is_control", "variant"],
+                                    ascending=[True, True, True, False, True], ignore_index=True)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--experiment", default=None, help="one experiment (default: all)")
+    ap.add_argument("--keys", nargs="+", default=None, help="segment keys to report (default: all)")
+    ap.add_argument("--out", default=None, help=".json or .parquet")
+    ap.add_argument("--control", default="A")
+    ap.add_argument("--alpha", type=float, default=ALPHA)
+    ap.add_argument("--kyc-delta", type=float, default=KYC_DELTA)
+    args = ap.parse_args()
+
+    started = time.perf_counter()
+    stats = load_segment_stats(args.experiment)
+    if args.keys:
+        stats = stats[stats["segment_key"].isin(args.keys)]
+    loaded = time.perf_counter()
+    report = analyze(stats, args.control, args.alpha, args.kyc_delta)
+    done = time.perf_counter()
+    if args.out:
+        params = {"schema": SCHEMA, "control": args.control, "alpha": args.alpha,
+                  "kyc_delta": args.kyc_delta, "keys": args.keys}
+        write_report(report, args.out, params)
+
+    cols = GROUP + ["variant", "n_users", "rate", "ci_low", "ci_high", "lift", "p_adjusted",
+                    "kyc_delta", "decision"]
+    with pd.option_context("display.width", 200, "display.max_rows", 500):
+        print(report[cols].round(4).to_string(index=False))
+    print(f"\n[info] {report[GROUP].drop_duplicates().shape[0]} segments, {len(report)} rows; "
+          f"query {loaded - started:.2f}s, analysis {done - loaded:.2f}s"
+          + (f" -> {args.out}" if args.out else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+class AssignmentCache:
+    """Bounded LRU cache with optional TTL for immutable assignment rows.
+
+    Keys are (user_id, experiment_key), values are variants. `capacity=0`
+    disables the cache; `ttl=0` keeps entries until they are evicted.
+    """
+
+    def __init__(self, capacity: int, ttl: float = 0.0):
+        self.capacity = max(0, capacity)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[str, float]]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: str) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def put_many(self, items: Iterable[Tuple[Hashable, str]]) -> None:
+        for key, value in items:
+            self.put(key, value)
+
+    def discard_many(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -1,41 +1,88 @@
-from dataclasses import dataclass
-from typing import Dict
+import hashlib, logging, os, threading
+from typing import Optional, Tuple
 from pathlib import Path
 import yaml
 
-@dataclass(frozen=True)
-class ExperimentCfg:
-    key: str
-    name: str
-    enabled: bool
-    allocation: Dict[str, int]
-    targeting: Dict[str, object]
+# snapshots are built in abcore, which abclient shares without the server's dependencies
+from abcore.config import AppConfig, build_config
 
-@dataclass(frozen=True)
-class AppConfig:
-    experiments: Dict[str, ExperimentCfg]
+log = logging.getLogger(__name__)
+DEFAULT_CONFIG_PATH = Path(__file__).parent / "experiments.yaml"
 
 def load_config(path: str | None = None) -> AppConfig:
-    cfg_path = Path(path or Path(__file__).parent / "experiments.yaml")
-    with open(cfg_path, "r") as f:
-        raw = yaml.safe_load(f)
-    exps: Dict[str, ExperimentCfg] = {}
-    for e in raw.get("experiments", []):
-        exps[e["key"]] = ExperimentCfg(
-            key=e["key"],
-            name=e.get("name", e["key"]),
-            enabled=bool(e.get("enabled", True)),
-            allocation=e.get("allocation", {"A": 50, "B": 50}),
-            targeting=e.get("targeting", {}),
-        )
-    return AppConfig(experiments=exps)
-
-def pick_variant_by_bucket(buckets: Dict[str, int], bucket_value: int) -> str:
-    cumulative = 0
-    for variant, pct in buckets.items():
-        if pct < 0:
-            raise ValueError("Allocation percent must be >= 0")
-        cumulative += pct
-        if bucket_value < cumulative:
-            return variant
-    return list(buckets.keys())[-1]
+    cfg_path = Path(path or os.getenv("EXPERIMENTS_CONFIG") or DEFAULT_CONFIG_PATH)
+    data = cfg_path.read_bytes()
+    return build_config(yaml.safe_load(data) or {}, hashlib.sha256(data).hexdigest()[:12])
+
+class ConfigStore:
+    """Holds the live config snapshot and swaps in new ones atomically.
+
+    Readers grab `store.current` once per request and keep using that
+    immutable snapshot; `reload` parses and validates the file completely
+    before replacing the reference, so a bad file never becomes live.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._current = load_config(path)
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> AppConfig:
+        return self._current
+
+    def reload(self) -> Tuple[AppConfig, AppConfig]:
+        """Load the file again; returns (previous, current). Raises if it is invalid."""
+        with self._reload_lock:
+            previous = self._current
+            try:
+                fresh = load_config(self.path)
+            except Exception as exc:
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                raise
+            self.last_error = None
+            if fresh.version != previous.version:
+                self._current = fresh
+                self.reloads += 1
+                log.info("experiment config reloaded: %s -> %s", previous.version, fresh.version)
+            return previous, self._current
+
+    def _stat(self):
+        st = Path(self.path or os.getenv("EXPERIMENTS_CONFIG") or DEFAULT_CONFIG_PATH).stat()
+        return st.st_mtime_ns, st.st_size
+
+    def watch(self, interval: float) -> None:
+        """Poll the file every `interval` seconds and reload when it changes."""
+        if self._watcher or interval <= 0:
+            return
+        self._stop.clear()
+
+        def run():
+            # None until the file is first seen, so a file missing at startup is loaded once it appears
+            last, first = None, True
+            while True:
+                try:
+                    seen = self._stat()
+                    if seen != last:
+                        # remembered before reloading: an invalid file is retried only once it changes
+                        last = seen
+                        if not first:
+                            self.reload()
+                except Exception:
+                    log.exception("experiment config reload failed, keeping %s", self._current.version)
+                first = False
+                if self._stop.wait(interval):
+                    return
+
+        self._watcher = threading.Thread(target=run, name="config-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join()
+            self._watcher = None
@@ -0,0 +1,282 @@
+import asyncio, os
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from . import ids
+from .metrics import DB_QUERY_SECONDS
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise RuntimeError("DATABASE_URL not set")
+# the async engine relies on psycopg 3 (postgresql+psycopg serves both engines)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "5"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# psycopg prepares a statement server-side after this many executions; 0 = always
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "1"))
+
+# the sync engine only serves background writers and bulk COPY
+engine: Engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+async_engine: AsyncEngine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_MIN,
+    max_overflow=max(0, DB_POOL_MAX - DB_POOL_MIN),
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={"prepare_threshold": DB_PREPARE_THRESHOLD},
+)
+
+# rows as the rest of the API sees them, with names; this module maps them to ids (api/ids.py)
+AssignmentRow = Tuple[str, str, str]
+EventRow = Tuple[datetime, str, str, str, str, Optional[str]]
+
+EVENTS_COPY = ("copy events_raw (ts, experiment_id, variant_id, event_type_id, user_id, metadata) "
+               "from stdin")
+
+SELECT_ASSIGNMENT = text("select variant_id from assignments where user_id=:u and experiment_id=:e")
+
+INSERT_ASSIGNMENT = text("""
+    insert into assignments (user_id, experiment_id, variant_id)
+    values (:u, :e, :v)
+    on conflict (user_id, experiment_id) do nothing
+    returning variant_id
+""")
+
+INSERT_ASSIGNMENTS = text("""
+    insert into assignments (user_id, experiment_id, variant_id)
+    select *
+    from unnest(cast(:u as text[]), cast(:e as int[]), cast(:v as smallint[]))
+    on conflict (user_id, experiment_id) do nothing
+""")
+
+# same insert, returning the rows it stored (a key that already had a row is left out)
+INSERT_ASSIGNMENTS_RETURNING = text(INSERT_ASSIGNMENTS.text.rstrip() + """
+    returning user_id, experiment_id, variant_id
+""")
+
+SELECT_ASSIGNMENTS = text("""
+    select a.user_id, a.experiment_id, a.variant_id
+    from assignments a
+    join unnest(cast(:u as text[]), cast(:e as int[])) as k(user_id, experiment_id)
+      using (user_id, experiment_id)
+""")
+
+RESOLVE_ASSIGNMENTS = text("""
+    with req as (
+        select *
+        from unnest(cast(:u as text[]), cast(:e as int[]), cast(:v as smallint[]))
+             as r(user_id, experiment_id, variant_id)
+    ),
+    existing as (
+        select a.user_id, a.experiment_id, a.variant_id
+        from assignments a
+        join req using (user_id, experiment_id)
+    ),
+    ins as (
+        insert into assignments (user_id, experiment_id, variant_id)
+        select req.user_id, req.experiment_id, req.variant_id
+        from req
+        where not exists (
+            select 1 from existing x
+            where x.user_id = req.user_id and x.experiment_id = req.experiment_id
+        )
+        on conflict (user_id, experiment_id) do nothing
+        returning user_id, experiment_id, variant_id
+    )
+    select user_id, experiment_id, variant_id from existing
+    union all
+    select user_id, experiment_id, variant_id from ins
+""")
+
+SELECT_RECENT_ASSIGNMENTS = text("""
+    select user_id, experiment_id, variant_id
+    from assignments
+    order by id desc
+    limit :n
+""")
+
+INSERT_EVENT = text("""
+    insert into events_raw (experiment_id, variant_id, event_type_id, user_id, metadata)
+    values (:e, :v, :t, :u, :m)
+    returning id
+""")
+
+INSERT_EVENTS = text("""
+    insert into events_raw (ts, experiment_id, variant_id, event_type_id, user_id, metadata)
+    select r.ts, r.e, r.v, r.t, r.u, cast(r.m as jsonb)
+    from unnest(
+        cast(:ts as timestamptz[]), cast(:e as int[]), cast(:v as smallint[]),
+        cast(:t as smallint[]), cast(:u as text[]), cast(:m as text[])
+    ) as r(ts, e, v, t, u, m)
+""")
+
+def _columns(rows: Sequence[tuple], names: Sequence[str]) -> dict:
+    return {name: list(col) for name, col in zip(names, zip(*rows))}
+
+def _wanted_assignments(rows: Sequence[AssignmentRow]) -> ids.Wanted:
+    return [(ids.EXPERIMENTS, (r[1] for r in rows)), (ids.VARIANTS, (r[2] for r in rows))]
+
+def _wanted_events(rows: Sequence[EventRow]) -> ids.Wanted:
+    return [(ids.EXPERIMENTS, (r[2] for r in rows)), (ids.VARIANTS, (r[3] for r in rows)),
+            (ids.EVENT_TYPES, (r[4] for r in rows))]
+
+def _encode_assignments(rows: Sequence[AssignmentRow]) -> List[Tuple[str, int, int]]:
+    e, v = ids.EXPERIMENTS.ids, ids.VARIANTS.ids
+    return [(u, e[exp], v[var]) for u, exp, var in rows]
+
+def _encode_events(rows: Sequence[EventRow]) -> List[tuple]:
+    """EventRows in events_raw column order: (ts, experiment_id, variant_id, event_type_id, user_id, metadata)."""
+    e, v, t = ids.EXPERIMENTS.ids, ids.VARIANTS.ids, ids.EVENT_TYPES.ids
+    return [(ts, e[exp], v[var], t[typ], u, m) for ts, u, exp, var, typ, m in rows]
+
+async def _decode_assignments(rows) -> List[AssignmentRow]:
+    """(user_id, experiment_id, variant_id) rows back to names."""
+    if not (ids.EXPERIMENTS.knows_ids(r[1] for r in rows) and ids.VARIANTS.knows_ids(r[2] for r in rows)):
+        # written by another process since we loaded the dictionaries
+        await ids.load_async(async_engine)
+    e, v = ids.EXPERIMENTS.names, ids.VARIANTS.names
+    return [(u, e[exp], v[var]) for u, exp, var in rows]
+
+async def open_pool() -> None:
+    """Open DB_POOL_MIN connections up front so the first requests don't pay for them.
+
+    Also loads the dictionary tables into memory.
+    """
+    conns = await asyncio.gather(*(async_engine.connect().start() for _ in range(DB_POOL_MIN)))
+    await asyncio.gather(*(c.close() for c in conns))
+    await ids.load_async(async_engine)
+
+async def ensure_ids(wanted: ids.Wanted) -> None:
+    """Map names this process has not seen yet to ids (inserting new ones); no I/O when all are known."""
+    await ids.ensure_async(async_engine, wanted)
+
+async def close_pool() -> None:
+    await async_engine.dispose()
+    engine.dispose()
+
+# --- sync (background writers) ---
+
+@DB_QUERY_SECONDS.time("save_assignments_bulk")
+def save_assignments_bulk(rows: List[AssignmentRow]) -> None:
+    """Insert many (user_id, experiment_key, variant) rows with one statement."""
+    if not rows:
+        return
+    ids.ensure(engine, _wanted_assignments(rows))
+    with engine.begin() as conn:
+        conn.execute(INSERT_ASSIGNMENTS, _columns(_encode_assignments(rows), "uev"))
+
+@DB_QUERY_SECONDS.time("insert_events")
+def insert_events(rows: List[EventRow]) -> None:
+    """Bulk-write (ts, user_id, experiment_key, variant, event_type, metadata_json) rows.
+
+    Uses COPY when the driver is psycopg 3, otherwise one multi-row insert.
+    """
+    if not rows:
+        return
+    ids.ensure(engine, _wanted_events(rows))
+    encoded = _encode_events(rows)
+    with engine.begin() as conn:
+        cursor = conn.connection.driver_connection.cursor()
+        if hasattr(cursor, "copy"):
+            with cursor.copy(EVENTS_COPY) as copy:
+                for row in encoded:
+                    copy.write_row(row)
+            return
+        conn.execute(INSERT_EVENTS, _columns(encoded, ["ts", *"evtum"]))
+
+# --- async (request path) ---
+
+@DB_QUERY_SECONDS.time("select_assignment")
+async def select_assignment(user_id: str, experiment_key: str) -> Optional[str]:
+    await ids.lookup_async(async_engine, [(ids.EXPERIMENTS, [experiment_key])])
+    experiment_id = ids.EXPERIMENTS.ids.get(experiment_key)
+    if experiment_id is None:
+        # never written, so nobody is assigned to it
+        return None
+    async with async_engine.connect() as conn:
+        row = (await conn.execute(SELECT_ASSIGNMENT, {"u": user_id, "e": experiment_id})).first()
+    if not row:
+        return None
+    if not ids.VARIANTS.knows_ids([row[0]]):
+        await ids.load_async(async_engine)
+    return ids.VARIANTS.names[row[0]]
+
+@DB_QUERY_SECONDS.time("insert_assignment")
+async def insert_assignment(user_id: str, experiment_key: str, variant: str) -> bool:
+    """Insert one assignment; False if a row for the key already existed."""
+    await ensure_ids([(ids.EXPERIMENTS, [experiment_key]), (ids.VARIANTS, [variant])])
+    async with async_engine.begin() as conn:
+        row = (await conn.execute(INSERT_ASSIGNMENT, {
+            "u": user_id, "e": ids.EXPERIMENTS.ids[experiment_key], "v": ids.VARIANTS.ids[variant],
+        })).first()
+    return row is not None
+
+@DB_QUERY_SECONDS.time("insert_assignments")
+async def insert_assignments(rows: List[AssignmentRow]) -> List[AssignmentRow]:
+    """Insert many assignments; returns the rows actually stored (keys without a row yet)."""
+    if not rows:
+        return []
+    await ensure_ids(_wanted_assignments(rows))
+    async with async_engine.begin() as conn:
+        result = await conn.execute(INSERT_ASSIGNMENTS_RETURNING, _columns(_encode_assignments(rows), "uev"))
+    return await _decode_assignments(result.all())
+
+@DB_QUERY_SECONDS.time("select_assignments")
+async def select_assignments(keys: List[Tuple[str, str]]) -> List[AssignmentRow]:
+    """Stored rows for these (user_id, experiment_key) keys; keys of unknown experiments have none."""
+    await ids.lookup_async(async_engine, [(ids.EXPERIMENTS, (e for _, e in keys))])
+    experiments = ids.EXPERIMENTS.ids
+    encoded = [(u, experiments[e]) for u, e in keys if e in experiments]
+    if not encoded:
+        return []
+    async with async_engine.connect() as conn:
+        result = await conn.execute(SELECT_ASSIGNMENTS, _columns(encoded, "ue"))
+    return await _decode_assignments(result.all())
+
+@DB_QUERY_SECONDS.time("resolve_assignment_rows")
+async def resolve_assignment_rows(rows: List[AssignmentRow]) -> List[AssignmentRow]:
+    """Return stored rows for the keys in `rows`, inserting the missing ones."""
+    await ensure_ids(_wanted_assignments(rows))
+    async with async_engine.begin() as conn:
+        result = await conn.execute(RESOLVE_ASSIGNMENTS, _columns(_encode_assignments(rows), "uev"))
+    return await _decode_assignments(result.all())
+
+async def select_recent_assignments(limit: int) -> List[AssignmentRow]:
+    async with async_engine.connect() as conn:
+        result = await conn.execute(SELECT_RECENT_ASSIGNMENTS, {"n": limit})
+    return await _decode_assignments(result.all())
+
+@DB_QUERY_SECONDS.time("insert_event")
+async def insert_event(
+    user_id: str, experiment_key: str, variant: str, event_type: str, metadata: Optional[str],
+) -> int:
+    await ensure_ids([(ids.EXPERIMENTS, [experiment_key]), (ids.VARIANTS, [variant]),
+                      (ids.EVENT_TYPES, [event_type])])
+    async with async_engine.begin() as conn:
+        row = (await conn.execute(INSERT_EVENT, {
+            "e": ids.EXPERIMENTS.ids[experiment_key], "v": ids.VARIANTS.ids[variant],
+            "t": ids.EVENT_TYPES.ids[event_type], "u": user_id, "m": metadata,
+        })).first()
+    return row[0]
+
+@DB_QUERY_SECONDS.time("copy_events")
+async def copy_events(rows: List[EventRow]) -> None:
+    """COPY event rows over the async pool."""
+    if not rows:
+        return
+    await ensure_ids(_wanted_events(rows))
+    encoded = _encode_events(rows)
+    async with async_engine.begin() as conn:
+        raw = await conn.get_raw_connection()
+        async with raw.driver_connection.cursor() as cursor:
+            async with cursor.copy(EVENTS_COPY) as copy:
+                for row in encoded:
+                    await copy.write_row(row)
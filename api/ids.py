@@ -0,0 +1,102 @@
+"""In-memory name <-> id maps for the dictionary tables.
+
+assignments and events_raw store experiments.id, variants.id and
+event_types.id instead of repeating the names (sql/init.sql). Ids never
+change once assigned, so every process keeps both directions in plain
+dicts: encoding a row is a few dict lookups, and the database is only
+asked about a name or id this process has not seen yet. Writes insert
+unknown names (get-or-create, `ensure`) in a short transaction of their
+own, and they enter the map only once committed, so no row can reference
+an id that might roll back. Reads only look names up (`lookup_async`):
+a name nobody has written has no rows, and asking about it creates nothing.
+"""
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+class Dictionary:
+    def __init__(self, table: str, column: str = "name", also: Sequence[str] = ()):
+        """`also`: other not-null columns that new rows fill with the name (experiments.name)."""
+        self.table = table
+        self.column = column
+        self.ids: Dict[str, int] = {}
+        self.names: Dict[int, str] = {}
+        self.select_all = text(f"select id, {column} from {table}")
+        self.select_names = text(f"select id, {column} from {table} where {column} = any(cast(:n as text[]))")
+        columns = [column, *also]
+        self.insert_names = text(f"""
+            insert into {table} ({", ".join(columns)})
+            select {", ".join("n" for _ in columns)} from unnest(cast(:n as text[])) as n
+            on conflict ({column}) do nothing
+        """)
+
+    def update(self, rows: Iterable[Tuple[int, str]]) -> None:
+        for id_, name in rows:
+            self.ids[name] = id_
+            self.names[id_] = name
+
+    def unknown_names(self, names: Iterable[str]) -> List[str]:
+        return [n for n in dict.fromkeys(names) if n not in self.ids]
+
+    def knows_ids(self, ids: Iterable[int]) -> bool:
+        return all(i in self.names for i in ids)
+
+EXPERIMENTS = Dictionary("experiments", "key", also=["name"])
+VARIANTS = Dictionary("variants")
+EVENT_TYPES = Dictionary("event_types")
+DICTIONARIES = (EXPERIMENTS, VARIANTS, EVENT_TYPES)
+
+Wanted = Sequence[Tuple[Dictionary, Iterable[str]]]
+
+def _pending(wanted: Wanted) -> List[Tuple[Dictionary, List[str]]]:
+    pending = [(d, d.unknown_names(names)) for d, names in wanted]
+    return [(d, missing) for d, missing in pending if missing]
+
+def load(engine: Engine) -> None:
+    """Read every dictionary table into memory."""
+    with engine.connect() as conn:
+        for d in DICTIONARIES:
+            d.update(conn.execute(d.select_all).all())
+
+def ensure(engine: Engine, wanted: Wanted) -> None:
+    """Make sure every (dictionary, names) pair is mapped, inserting unknown names."""
+    pending = _pending(wanted)
+    if not pending:
+        return
+    found = []
+    with engine.begin() as conn:
+        for d, missing in pending:
+            conn.execute(d.insert_names, {"n": missing})
+            # a separate statement sees rows a concurrent insert committed meanwhile
+            found.append((d, conn.execute(d.select_names, {"n": missing}).all()))
+    for d, rows in found:
+        d.update(rows)
+
+async def load_async(engine) -> None:
+    async with engine.connect() as conn:
+        for d in DICTIONARIES:
+            d.update((await conn.execute(d.select_all)).all())
+
+async def lookup_async(engine, wanted: Wanted) -> None:
+    """Map the names that already exist; unknown ones stay out of the maps and are not inserted."""
+    pending = _pending(wanted)
+    if not pending:
+        return
+    async with engine.connect() as conn:
+        found = [(d, (await conn.execute(d.select_names, {"n": missing})).all()) for d, missing in pending]
+    for d, rows in found:
+        d.update(rows)
+
+async def ensure_async(engine, wanted: Wanted) -> None:
+    """`ensure` on an AsyncEngine."""
+    pending = _pending(wanted)
+    if not pending:
+        return
+    found = []
+    async with engine.begin() as conn:
+        for d, missing in pending:
+            await conn.execute(d.insert_names, {"n": missing})
+            found.append((d, (await conn.execute(d.select_names, {"n": missing})).all()))
+    for d, rows in found:
+        d.update(rows)
@@ -1,53 +1,224 @@
-import os, hashlib, json
-from datetime import datetime
-from typing import Optional, Dict, Any
-
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel, Field
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
-from dotenv import load_dotenv
-
-from .config import load_config, pick_variant_by_bucket
-
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL not set")
-
-engine: Engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
-app = FastAPI(title="AB Onboarding Service", version="0.1.0")
-cfg = load_config()
-
-def stable_bucket(user_id: str, experiment_key: str) -> int:
-    h = hashlib.sha256(f"{user_id}:{experiment_key}".encode("utf-8")).hexdigest()
-    return int(h[:8], 16) % 100
-
-def get_assignment(user_id: str, experiment_key: str) -> Optional[str]:
-    with engine.begin() as conn:
-        row = conn.execute(
-            text("select variant from assignments where user_id=:u and experiment_key=:e"),
-            {"u": user_id, "e": experiment_key},
-        ).first()
-        return row[0] if row else None
-
-def save_assignment(user_id: str, experiment_key: str, variant: str) -> None:
-    with engine.begin() as conn:
-        conn.execute(
-            text("""
-                insert into assignments (user_id, experiment_key, variant)
-                values (:u, :e, :v)
-                on conflict (user_id, experiment_key) do nothing
-            """),
-            {"u": user_id, "e": experiment_key, "v": variant},
-        )
+import hmac, os, json, zlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError
+
+from abcore.bucketing import stable_bucket
+from abcore.config import AppConfig, snapshot
+from abcore.writer import BatchWriter
+
+from . import db
+from .cache import AssignmentCache
+from .config import ConfigStore
+from .db import AssignmentRow, EventRow
+from .metrics import ASSIGNMENTS, REGISTRY, VARIANT_MISMATCHES, MetricsMiddleware, pool_samples
+
+ASSIGN_BATCH_MAX = int(os.getenv("ASSIGN_BATCH_MAX", "1000"))
+ASSIGN_CACHE_SIZE = int(os.getenv("ASSIGN_CACHE_SIZE", "100000"))
+ASSIGN_CACHE_TTL = float(os.getenv("ASSIGN_CACHE_TTL", "0"))
+ASSIGN_CACHE_WARM = os.getenv("ASSIGN_CACHE_WARM", "0") == "1"
+ASSIGN_WRITE_BEHIND = os.getenv("ASSIGN_WRITE_BEHIND", "0") == "1"
+ASSIGN_FLUSH_SIZE = int(os.getenv("ASSIGN_FLUSH_SIZE", "500"))
+ASSIGN_FLUSH_INTERVAL = float(os.getenv("ASSIGN_FLUSH_INTERVAL", "0.2"))
+ASSIGN_QUEUE_MAX = int(os.getenv("ASSIGN_QUEUE_MAX", "100000"))
+WRITER_RETRIES = int(os.getenv("WRITER_RETRIES", "3"))
+WRITER_BACKOFF = float(os.getenv("WRITER_BACKOFF", "0.5"))
+EVENT_BUFFERED = os.getenv("EVENT_BUFFERED", "0") == "1"
+EVENT_FLUSH_SIZE = int(os.getenv("EVENT_FLUSH_SIZE", "1000"))
+EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", "0.5"))
+EVENT_BUFFER_MAX = int(os.getenv("EVENT_BUFFER_MAX", "50000"))
+EVENTS_BULK_MAX_LINES = int(os.getenv("EVENTS_BULK_MAX_LINES", "10000"))
+EVENTS_BULK_MAX_BYTES = int(os.getenv("EVENTS_BULK_MAX_BYTES", str(32 * 2**20)))  # decompressed
+EVENTS_BULK_MAX_LINE_BYTES = int(os.getenv("EVENTS_BULK_MAX_LINE_BYTES", str(64 * 2**10)))
+BULK_INFLATE_STEP = 64 * 2**10  # gzip output per decompress call
+CONFIG_WATCH_INTERVAL = float(os.getenv("CONFIG_WATCH_INTERVAL", "0"))
+# event types /event and /events/bulk accept (each new name takes a smallint id in event_types)
+EVENT_TYPES = frozenset(
+    t.strip() for t in os.getenv("EVENT_TYPES", "exposure,signup_start,signup_complete,kyc_complete").split(",")
+    if t.strip()
+)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+config_store = ConfigStore()
+assignment_cache = AssignmentCache(ASSIGN_CACHE_SIZE, ASSIGN_CACHE_TTL)
+
+event_writer: Optional[BatchWriter] = (
+    BatchWriter(
+        "event-writer",
+        db.insert_events,
+        max_batch=EVENT_FLUSH_SIZE,
+        interval=EVENT_FLUSH_INTERVAL,
+        max_queue=EVENT_BUFFER_MAX,
+        retries=WRITER_RETRIES,
+        backoff=WRITER_BACKOFF,
+    )
+    if EVENT_BUFFERED
+    else None
+)
+
+def forget_assignments(rows: List[Tuple[str, str, str]]) -> None:
+    """Evict write-behind rows that were never stored, so reads stop serving them as persisted."""
+    assignment_cache.discard_many((u, e) for u, e, _ in rows)
+
+assignment_writer: Optional[BatchWriter] = (
+    BatchWriter(
+        "assignment-writer",
+        db.save_assignments_bulk,
+        max_batch=ASSIGN_FLUSH_SIZE,
+        interval=ASSIGN_FLUSH_INTERVAL,
+        max_queue=ASSIGN_QUEUE_MAX,
+        retries=WRITER_RETRIES,
+        backoff=WRITER_BACKOFF,
+        on_drop=forget_assignments,
+    )
+    if ASSIGN_WRITE_BEHIND
+    else None
+)
+
+async def warm_assignment_cache() -> int:
+    """Load the most recent assignments (up to cache capacity) into the cache."""
+    if not assignment_cache.enabled:
+        return 0
+    rows = await db.select_recent_assignments(assignment_cache.capacity)
+    # oldest first so the newest rows end up most recently used
+    assignment_cache.put_many(((u, e), v) for u, e, v in reversed(rows))
+    return len(rows)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.open_pool()
+    if ASSIGN_CACHE_WARM:
+        await warm_assignment_cache()
+    for writer in (assignment_writer, event_writer):
+        if writer:
+            writer.start()
+    config_store.watch(CONFIG_WATCH_INTERVAL)
+    yield
+    config_store.stop()
+    for writer in (event_writer, assignment_writer):
+        if writer:
+            writer.stop()
+    await db.close_pool()
+
+app = FastAPI(title="AB Onboarding Service", version="0.1.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# counter children resolved once, off the request path
+ASSIGN_NEW = ASSIGNMENTS.labels("/assign", "new")
+ASSIGN_EXISTING = ASSIGNMENTS.labels("/assign", "existing")
+ASSIGN_INELIGIBLE = ASSIGNMENTS.labels("/assign", "ineligible")
+EVENT_NEW_ASSIGNMENT = ASSIGNMENTS.labels("/event", "new")
+EVENT_MISMATCH = VARIANT_MISMATCHES.labels("/event")
+BULK_NEW_ASSIGNMENT = ASSIGNMENTS.labels("/events/bulk", "new")
+BULK_MISMATCH = VARIANT_MISMATCHES.labels("/events/bulk")
+
+REGISTRY.gauge("db_pool_connections", "SQLAlchemy pool connections by state.", ["engine", "state"],
+               pool_samples({"async": db.async_engine.pool, "sync": db.engine.pool}))
+REGISTRY.gauge("assignment_cache_stats", "Assignment cache size and lifetime hit/miss counts.", ["stat"],
+               lambda: [((k,), v) for k, v in assignment_cache.stats().items() if k != "hit_ratio"])
+REGISTRY.gauge("writer_queue_depth", "Items waiting in the background write queues.", ["writer"],
+               lambda: [((w.name,), w.depth()) for w in (assignment_writer, event_writer) if w])
+REGISTRY.gauge("writer_items", "Background writer lifetime counts: flushed and dropped items, failed flushes.",
+               ["writer", "stat"],
+               lambda: [((w.name, k), getattr(w, k)) for w in (assignment_writer, event_writer) if w
+                        for k in ("flushed", "failed", "dropped")])
+
+async def get_assignment(user_id: str, experiment_key: str) -> Optional[str]:
+    cached = assignment_cache.get((user_id, experiment_key))
+    if cached:
+        return cached
+    variant = await db.select_assignment(user_id, experiment_key)
+    if variant:
+        assignment_cache.put((user_id, experiment_key), variant)
+    return variant
+
+async def save_assignment(user_id: str, experiment_key: str, variant: str) -> None:
+    # only cache what we actually stored; a lost race is picked up on the next read
+    if await db.insert_assignment(user_id, experiment_key, variant):
+        assignment_cache.put((user_id, experiment_key), variant)
+
+async def persist_assignment(user_id: str, experiment_key: str, variant: str) -> None:
+    """Store a new assignment, through the write-behind queue when enabled.
+
+    Queued rows are cached right away so reads stay consistent until the
+    writer flushes them. If the queue is full we fall back to a direct insert.
+    """
+    if assignment_writer and assignment_writer.submit((user_id, experiment_key, variant)):
+        assignment_cache.put((user_id, experiment_key), variant)
+        return
+    await save_assignment(user_id, experiment_key, variant)
+
+async def resolve_assignments(pairs: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str], str]:
+    """Fetch existing assignments and insert missing ones in a single statement.
+
+    `pairs` holds (user_id, experiment_key, computed_variant). Existing rows win;
+    the computed variant is inserted for the rest. Rows that lose a concurrent
+    insert race are returned by neither branch, so they are read back: the
+    other writer may have stored a different variant (/event and /events/bulk
+    persist the one the client sent).
+    """
+    resolved: Dict[Tuple[str, str], str] = {}
+    misses = []
+    for u, e, v in pairs:
+        cached = assignment_cache.get((u, e))
+        if cached:
+            resolved[(u, e)] = cached
+        else:
+            misses.append((u, e, v))
+    if not misses:
+        return resolved
+    stored = {(u, e): v for u, e, v in await db.resolve_assignment_rows(misses)}
+    lost = [(u, e) for u, e, _ in misses if (u, e) not in stored]
+    if lost:
+        stored.update({(u, e): v for u, e, v in await db.select_assignments(lost)})
+    assignment_cache.put_many(stored.items())
+    # only a row deleted in between is still missing; it gets the computed variant
+    resolved.update({(u, e): v for u, e, v in misses})
+    resolved.update(stored)
+    return resolved
+
+async def fetch_assignments(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+    """Look up stored variants for many (user_id, experiment_key) keys in one query."""
+    found: Dict[Tuple[str, str], str] = {}
+    misses = []
+    for key in dict.fromkeys(keys):
+        cached = assignment_cache.get(key)
+        if cached:
+            found[key] = cached
+        else:
+            misses.append(key)
+    if not misses:
+        return found
+    stored = {(u, e): v for u, e, v in await db.select_assignments(misses)}
+    assignment_cache.put_many(stored.items())
+    found.update(stored)
+    return found
 
 class AssignResponse(BaseModel):
     experiment_key: str
-    variant: str
+    variant: Optional[str] = None  # None when the user is not eligible
+    eligible: bool = True
+    reason: Optional[str] = None
+    config_version: Optional[str] = None
     assigned_at: datetime = Field(default_factory=datetime.utcnow)
     source: str = "api"
 
+class AssignBatchIn(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1)
+    experiments: List[str] = Field(..., min_length=1)
+    # targeting attributes (country, device, app_version, new_user, ...) for all users
+    attributes: Dict[str, Any] = Field(default_factory=dict)
+
+class BatchAssignment(AssignResponse):
+    user_id: str
+
+class AssignBatchResponse(BaseModel):
+    assignments: List[BatchAssignment]
+
 class EventIn(BaseModel):
     user_id: str
     experiment_key: str
@@ -57,53 +228,316 @@ class EventIn(BaseModel):
 
 class EventOut(BaseModel):
     status: str
-    id: int
+    id: Optional[int] = None  # not known yet when the event is buffered
+
+class ConfigReloadOut(BaseModel):
+    previous_version: str
+    version: str
+    changed: bool
+    experiments: List[str]
+
+class BulkEventError(BaseModel):
+    line: int
+    error: str
+    # on a variant mismatch: the variant already stored for the user
+    assigned: Optional[str] = None
+
+class BulkEventsOut(BaseModel):
+    accepted: int
+    rejected: int
+    errors: List[BulkEventError]
 
 @app.get("/health")
 def health():
-    return {"ok": True, "time": datetime.utcnow().isoformat()}
+    return {
+        "ok": True,
+        "time": datetime.utcnow().isoformat(),
+        "config_version": config_store.current.version,
+        "assignment_cache": assignment_cache.stats(),
+        "assignment_writer": assignment_writer.stats() if assignment_writer else None,
+        "event_writer": event_writer.stats() if event_writer else None,
+    }
+
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/assign", response_model=AssignResponse)
-def assign(user_id: str = Query(...), experiment: str = Query(...)):
+async def assign(
+    user_id: str = Query(...),
+    experiment: str = Query(...),
+    country: Optional[str] = None,
+    device: Optional[str] = None,
+    app_version: Optional[str] = None,
+    new_user: Optional[bool] = None,
+):
+    cfg = config_store.current
     exp = cfg.experiments.get(experiment)
     if not exp:
         raise HTTPException(status_code=404, detail="Experiment not found")
     if not exp.enabled:
         raise HTTPException(status_code=403, detail="Experiment disabled")
 
-    current = get_assignment(user_id=user_id, experiment_key=experiment)
+    attrs = {"country": country, "device": device, "app_version": app_version, "new_user": new_user}
+    reason = exp.eligibility.evaluate(user_id, attrs)
+    if reason:
+        ASSIGN_INELIGIBLE.inc()
+        return AssignResponse(
+            experiment_key=experiment, eligible=False, reason=reason, config_version=cfg.version,
+        )
+
+    current = await get_assignment(user_id=user_id, experiment_key=experiment)
     if current:
-        return AssignResponse(experiment_key=experiment, variant=current)
+        ASSIGN_EXISTING.inc()
+        return AssignResponse(experiment_key=experiment, variant=current, config_version=cfg.version)
+
+    variant = exp.variant_for_bucket(stable_bucket(user_id, experiment))
+    await persist_assignment(user_id, experiment, variant)
+    ASSIGN_NEW.inc()
+    return AssignResponse(experiment_key=experiment, variant=variant, config_version=cfg.version)
+
+@app.post("/assign/batch", response_model=AssignBatchResponse)
+async def assign_batch(req: AssignBatchIn):
+    user_ids = list(dict.fromkeys(req.user_ids))
+    experiments = list(dict.fromkeys(req.experiments))
+    if len(user_ids) * len(experiments) > ASSIGN_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: at most {ASSIGN_BATCH_MAX} user/experiment pairs",
+        )
+    cfg = config_store.current
+    exps = []
+    for key in experiments:
+        exp = cfg.experiments.get(key)
+        if not exp:
+            raise HTTPException(status_code=404, detail=f"Experiment not found: {key}")
+        if not exp.enabled:
+            raise HTTPException(status_code=403, detail=f"Experiment disabled: {key}")
+        exps.append(exp)
+
+    # one entry per pair in request order: an ineligible answer, or None until resolved
+    out: List[Optional[BatchAssignment]] = []
+    pairs = []
+    for u in user_ids:
+        for exp in exps:
+            reason = exp.eligibility.evaluate(u, req.attributes)
+            if reason:
+                out.append(BatchAssignment(
+                    user_id=u, experiment_key=exp.key, eligible=False, reason=reason,
+                    config_version=cfg.version,
+                ))
+            else:
+                out.append(None)
+                pairs.append((u, exp.key, exp.variant_for_bucket(stable_bucket(u, exp.key))))
+    resolved = await resolve_assignments(pairs)
+    eligible = iter(pairs)
+    for i, item in enumerate(out):
+        if item is None:
+            u, e, _ = next(eligible)
+            out[i] = BatchAssignment(
+                user_id=u, experiment_key=e, variant=resolved[(u, e)], config_version=cfg.version,
+            )
+    return AssignBatchResponse(assignments=out)
+
+_snapshot_body: Tuple[str, bytes] = ("", b"")
+
+def snapshot_body(cfg: AppConfig) -> bytes:
+    """Serialised snapshot, rebuilt only when the config version changes."""
+    global _snapshot_body
+    version, body = _snapshot_body
+    if version != cfg.version:
+        body = json.dumps(snapshot(cfg), separators=(",", ":")).encode()
+        _snapshot_body = (cfg.version, body)
+    return body
+
+@app.get("/config/snapshot")
+def config_snapshot(if_none_match: Optional[str] = Header(None)):
+    """The live experiment config for clients that assign locally (see abclient/).
+
+    The ETag is the config version; a matching `If-None-Match` gets a 304.
+    """
+    cfg = config_store.current
+    etag = f'"{cfg.version}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(snapshot_body(cfg), media_type="application/json", headers={"ETag": etag})
 
-    bucket = stable_bucket(user_id, experiment)
-    variant = pick_variant_by_bucket(exp.allocation, bucket)
-    save_assignment(user_id, experiment, variant)
-    return AssignResponse(experiment_key=experiment, variant=variant)
+@app.post("/admin/config/reload", response_model=ConfigReloadOut)
+async def reload_config(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Config reload disabled: ADMIN_TOKEN is not set")
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    try:
+        # parse and compile off the event loop; requests keep the old snapshot meanwhile
+        previous, current = await run_in_threadpool(config_store.reload)
+    except Exception as exc:
+        raise HTTPException(status_code=422, detail=f"Config rejected: {exc}")
+    return ConfigReloadOut(
+        previous_version=previous.version,
+        version=current.version,
+        changed=previous.version != current.version,
+        experiments=sorted(current.experiments),
+    )
+
+def event_error(evt: EventIn, cfg: AppConfig) -> Optional[str]:
+    """Why `evt` cannot be stored: experiment and variant must be in the live config, the type in EVENT_TYPES."""
+    exp = cfg.experiments.get(evt.experiment_key)
+    if exp is None:
+        return f"Unknown experiment {evt.experiment_key!r}"
+    if evt.variant not in exp.allocation:
+        return f"Unknown variant {evt.variant!r} for {evt.experiment_key}"
+    if evt.event_type not in EVENT_TYPES:
+        return f"Unknown event type {evt.event_type!r}"
+    return None
 
 @app.post("/event", response_model=EventOut)
-def log_event(evt: EventIn):
-    assigned = get_assignment(evt.user_id, evt.experiment_key)
+async def log_event(evt: EventIn, response: Response):
+    error = event_error(evt, config_store.current)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    assigned = await get_assignment(evt.user_id, evt.experiment_key)
     if assigned and assigned != evt.variant:
+        EVENT_MISMATCH.inc()
         raise HTTPException(
             status_code=400,
             detail=f"Variant mismatch: assigned {assigned}, got {evt.variant}",
         )
     if not assigned:
-        save_assignment(evt.user_id, evt.experiment_key, evt.variant)
-
-    with engine.begin() as conn:
-        row = conn.execute(
-            text("""
-                insert into events_raw (user_id, experiment_key, variant, event_type, metadata)
-                values (:u, :e, :v, :t, :m)
-                returning id
-            """),
-            {
-                "u": evt.user_id,
-                "e": evt.experiment_key,
-                "v": evt.variant,
-                "t": evt.event_type,
-                "m": json.dumps(evt.metadata) if evt.metadata else None,
-            },
-        ).first()
-        return EventOut(status="ok", id=row[0])
+        await persist_assignment(evt.user_id, evt.experiment_key, evt.variant)
+        EVENT_NEW_ASSIGNMENT.inc()
+
+    metadata = json.dumps(evt.metadata) if evt.metadata else None
+    if event_writer:
+        row = (datetime.now(timezone.utc), evt.user_id, evt.experiment_key,
+               evt.variant, evt.event_type, metadata)
+        if not event_writer.submit(row):
+            raise HTTPException(
+                status_code=503,
+                detail="Event buffer full, retry later",
+                headers={"Retry-After": "1"},
+            )
+        response.status_code = 202
+        return EventOut(status="queued")
+
+    event_id = await db.insert_event(
+        evt.user_id, evt.experiment_key, evt.variant, evt.event_type, metadata,
+    )
+    return EventOut(status="ok", id=event_id)
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'body'}: {err['msg']}"
+        for err in exc.errors(include_url=False)
+    )
+
+async def _ingest_bulk(events: List[Tuple[int, EventIn]], errors: List[BulkEventError]) -> int:
+    """Check variants for the whole batch at once, then store assignments and events."""
+    assigned = await fetch_assignments([(e.user_id, e.experiment_key) for _, e in events])
+    new_assignments: Dict[Tuple[str, str], str] = {}
+    now = datetime.now(timezone.utc)
+    rows: List[EventRow] = []
+    for line_no, evt in events:
+        key = (evt.user_id, evt.experiment_key)
+        expected = assigned.get(key) or new_assignments.get(key)
+        if expected and expected != evt.variant:
+            BULK_MISMATCH.inc()
+            errors.append(BulkEventError(
+                line=line_no, error=f"Variant mismatch: assigned {expected}, got {evt.variant}",
+                assigned=expected,
+            ))
+            continue
+        if not expected:
+            new_assignments[key] = evt.variant
+        rows.append((now, evt.user_id, evt.experiment_key, evt.variant, evt.event_type,
+                     json.dumps(evt.metadata) if evt.metadata else None))
+
+    new_rows = [(u, e, v) for (u, e), v in new_assignments.items()]
+    BULK_NEW_ASSIGNMENT.inc(len(new_rows))
+    if assignment_writer:
+        # queued rows are cached right away, like persist_assignment
+        queued: List[AssignmentRow] = []
+        direct: List[AssignmentRow] = []
+        for r in new_rows:
+            (queued if assignment_writer.submit(r) else direct).append(r)
+        assignment_cache.put_many(((u, e), v) for u, e, v in queued)
+        new_rows = direct
+    # only cache what we actually stored; a lost race is picked up on the next read
+    stored = await db.insert_assignments(new_rows)
+    assignment_cache.put_many(((u, e), v) for u, e, v in stored)
+    await db.copy_events(rows)
+    return len(rows)
+
+@app.post("/events/bulk", response_model=BulkEventsOut)
+async def log_events_bulk(request: Request):
+    """Ingest newline-delimited JSON events (optionally `Content-Encoding: gzip`).
+
+    Each line is an `EventIn`. Invalid lines are reported by 1-based line number
+    and skipped; valid lines are stored with one bulk write. The body is
+    inflated a step at a time, so a request over EVENTS_BULK_MAX_BYTES
+    (decompressed) or with a line over EVENTS_BULK_MAX_LINE_BYTES gets a 413
+    before either is held in memory.
+    """
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    cfg = config_store.current
+    events: List[Tuple[int, EventIn]] = []
+    errors: List[BulkEventError] = []
+    line_no = 0
+    received = 0
+    pending = b""
+
+    def too_large(detail: str) -> HTTPException:
+        return HTTPException(status_code=413, detail=detail)
+
+    def parse(line: bytes) -> None:
+        nonlocal line_no
+        line_no += 1
+        if line_no > EVENTS_BULK_MAX_LINES:
+            raise too_large(f"Too many lines: at most {EVENTS_BULK_MAX_LINES} per request")
+        if len(line) > EVENTS_BULK_MAX_LINE_BYTES:
+            raise too_large(f"Line {line_no} too long: at most {EVENTS_BULK_MAX_LINE_BYTES} bytes")
+        if not line.strip():
+            return
+        try:
+            evt = EventIn.model_validate_json(line)
+        except ValidationError as exc:
+            errors.append(BulkEventError(line=line_no, error=_validation_message(exc)))
+            return
+        error = event_error(evt, cfg)
+        if error:
+            errors.append(BulkEventError(line=line_no, error=error))
+            return
+        events.append((line_no, evt))
+
+    def feed(data: bytes) -> None:
+        nonlocal received, pending
+        received += len(data)
+        if received > EVENTS_BULK_MAX_BYTES:
+            raise too_large(f"Body too large: at most {EVENTS_BULK_MAX_BYTES} bytes decompressed")
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            parse(line)
+        if len(pending) > EVENTS_BULK_MAX_LINE_BYTES:
+            raise too_large(f"Line {line_no + 1} too long: at most {EVENTS_BULK_MAX_LINE_BYTES} bytes")
+
+    try:
+        async for chunk in request.stream():
+            if not decoder:
+                feed(chunk)
+                continue
+            while chunk:
+                feed(decoder.decompress(chunk, BULK_INFLATE_STEP))
+                chunk = decoder.unconsumed_tail
+        if decoder:
+            feed(decoder.flush())
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+    # a body ending in a newline leaves nothing here, which is not one more line
+    if pending:
+        parse(pending)
+
+    accepted = await _ingest_bulk(events, errors) if events else 0
+    errors.sort(key=lambda e: e.line)
+    return BulkEventsOut(accepted=accepted, rejected=len(errors), errors=errors)
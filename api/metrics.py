@@ -0,0 +1,278 @@
+"""In-process metrics rendered in the Prometheus text format (`GET /metrics`).
+
+A deliberately small registry instead of a client library: counters and
+fixed-bucket histograms with label children resolved once and cached,
+plus gauges read from callbacks at scrape time (pool, cache and writer
+state cost nothing between scrapes). Recording is a dict lookup, a
+bisect and an add under a lock, so it can stay on under full load;
+`METRICS_ENABLED=0` turns the request middleware and DB timers off.
+
+Request latency is recorded by `MetricsMiddleware`, a plain ASGI
+middleware labelled with the route template (`/assign`, not the URL) so
+cardinality stays bounded; unmatched paths share the `other` label.
+"""
+import functools, inspect, os, threading, time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# seconds; request latency is mostly sub-10ms with a DB round trip
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Exposition lines, header included."""
+
+class _ChildMetric(_Metric):
+    """Metric recorded through one child per label values, made by `new_child()`."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], new_child: Callable[[], object]):
+        super().__init__(name, help, labels)
+        self._new_child = new_child
+        self._children: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """The child for these label values (created on first use)."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+class Counter(_ChildMetric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels, _CounterChild)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_label_str(self.label_names, values)} {_fmt(child.value)}")
+        return lines
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+class Histogram(_ChildMetric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels, functools.partial(_HistogramChild, self.buckets))
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self, *values: str) -> Callable:
+        """Decorator recording a function's duration (sync or async) under these labels."""
+        def decorate(fn):
+            if not METRICS_ENABLED:
+                return fn
+            child = self.labels(*values)
+
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_timed(*args, **kwargs):
+                    started = time.perf_counter()
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        child.observe(time.perf_counter() - started)
+                return async_timed
+
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - started)
+            return timed
+        return decorate
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = _label_str(self.label_names, values, f'le="{_fmt(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _label_str(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_fmt(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class CallbackGauge(_Metric):
+    """Gauge whose samples come from `fn() -> [(label_values, value), ...]` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str],
+                 fn: Callable[[], Iterable[Tuple[Labels, float]]]):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for values, value in self.fn():
+            lines.append(f"{self.name}{_label_str(self.label_names, values)} {_fmt(value)}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str],
+              fn: Callable[[], Iterable[Tuple[Labels, float]]]) -> CallbackGauge:
+        return self.register(CallbackGauge(name, help, labels, fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    ["method", "route", "status"],
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Database call latency by statement, including pool checkout.",
+    ["statement"],
+)
+ASSIGNMENTS = REGISTRY.counter(
+    "assignments_total", "Assignment lookups by endpoint and result (new, existing, ineligible).",
+    ["endpoint", "result"],
+)
+VARIANT_MISMATCHES = REGISTRY.counter(
+    "variant_mismatch_total", "Events rejected because their variant differs from the stored assignment.",
+    ["endpoint"],
+)
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request into `http_request_duration_seconds`."""
+
+    # requests currently being served; only touched from the event loop
+    in_flight = 0
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        MetricsMiddleware.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            MetricsMiddleware.in_flight -= 1
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "other"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], path, status).observe(time.perf_counter() - started)
+
+REGISTRY.gauge("http_requests_in_flight", "Requests currently being served.", [],
+               lambda: [((), MetricsMiddleware.in_flight)])
+
+def pool_samples(pools: Dict[str, object]) -> Callable[[], List[Tuple[Labels, float]]]:
+    """Callback for the pool gauge: checked-out / idle / overflow / size per SQLAlchemy pool."""
+    def collect():
+        samples = []
+        for engine, pool in pools.items():
+            for state, getter in (("checked_out", "checkedout"), ("idle", "checkedin"),
+                                  ("overflow", "overflow"), ("size", "size")):
+                fn: Optional[Callable[[], int]] = getattr(pool, getter, None)
+                if fn is not None:
+                    # QueuePool counts overflow from -size upwards
+                    value = max(0, fn()) if state == "overflow" else fn()
+                    samples.append(((engine, state), float(value)))
+        return samples
+    return collect
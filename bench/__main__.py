@@ -0,0 +1,82 @@
+"""Benchmark suite runner.
+
+    python -m bench run [--suites micro e2e pipeline] [--out bench/results/latest.json]
+    python -m bench compare bench/results/baseline.json bench/results/latest.json [--threshold 0.15]
+    python -m bench micro | e2e | pipeline       # one suite, printed only
+
+Suites (see each module): `micro` needs nothing; `e2e` and `pipeline`
+need a local Postgres at BENCH_DATABASE_URL with sql/init.sql applied.
+`compare` prints every benchmark present in both files and exits 1 when
+any got slower than the baseline by more than `--threshold`.
+"""
+import argparse, os, sys
+
+# the API reads DATABASE_URL at import; point it at the bench database
+# (the micro suite never connects, any URL will do)
+WORKING_DATABASE_URL = os.getenv("DATABASE_URL")
+if os.getenv("BENCH_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg://postgres@localhost:5432/abbench")
+
+from . import harness  # noqa: E402
+
+SUITES = ["micro", "e2e", "pipeline"]
+
+def run_suite(name: str, args) -> harness.Results:
+    if name == "micro":
+        from . import micro
+        return micro.run()
+    if name == "e2e":
+        from . import e2e
+        return e2e.run(args.requests)
+    from . import pipeline
+    return pipeline.run(args.users, protect=WORKING_DATABASE_URL)
+
+def print_results(results: harness.Results) -> None:
+    for name, r in sorted(results.items()):
+        print(f"{name:<48} {r['value']:>12.4f} {r['unit']}")
+
+def print_comparison(rows) -> None:
+    print(f"{'benchmark':<48} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for r in rows:
+        flag = "  REGRESSION" if r["regressed"] else "  faster" if r["improved"] else ""
+        print(f"{r['name']:<48} {r['baseline']:>12.4f} {r['current']:>12.4f} {r['ratio']:>7.2f}{flag}")
+
+def main():
+    ap = argparse.ArgumentParser(prog="python -m bench", description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="run suites and save the results as JSON")
+    run.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    run.add_argument("--out", default="bench/results/latest.json")
+    cmp_ = sub.add_parser("compare", help="flag regressions against a baseline results file")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("current")
+    cmp_.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown (0.15 = 15%%)")
+    for name in SUITES:
+        sub.add_parser(name, help=f"run the {name} suite and print it")
+    for p in [run] + [sub.choices[n] for n in SUITES]:
+        p.add_argument("--requests", type=int, default=2000, help="e2e: requests per scenario")
+        p.add_argument("--users", type=int, default=200_000, help="pipeline: synthetic users")
+    args = ap.parse_args()
+
+    if args.cmd == "compare":
+        rows = harness.compare(harness.load(args.baseline), harness.load(args.current), args.threshold)
+        print_comparison(rows)
+        regressed = [r["name"] for r in rows if r["regressed"]]
+        if regressed:
+            print(f"\n{len(regressed)} regression(s) over {args.threshold:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+        return
+
+    suites = args.suites if args.cmd == "run" else [args.cmd]
+    results: harness.Results = {}
+    for name in suites:
+        results.update(run_suite(name, args))
+    print_results(results)
+    if args.cmd == "run":
+        harness.save(results, args.out, suites, {"requests": args.requests, "users": args.users})
+        print(f"\n[info] {len(results)} results -> {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""End-to-end /assign and /event requests through the in-process app.
+
+    BENCH_DATABASE_URL=postgresql+psycopg://.../abbench python -m bench e2e
+
+Requests go through FastAPI's TestClient (routing, validation,
+serialisation, cache, connection pool and the real queries) against
+the Postgres at BENCH_DATABASE_URL; no network hop or server process is
+involved. Users get a fresh prefix per run so /assign creates rows:
+
+    assign_new       first /assign of a user (select + insert)
+    assign_cached    the same users again (served by the assignment cache)
+    assign_stored    again with the cache cleared (one select)
+    event            POST /event for an assigned user (one insert)
+"""
+import time
+from typing import Callable, List, Tuple
+
+from fastapi.testclient import TestClient
+
+from api.main import app, assignment_cache
+
+from .harness import Results, entry, latency
+
+EXPERIMENT = "onboarding_progressive_v1"
+
+def _timed(calls: List[Callable[[], object]]) -> Tuple[List[float], list]:
+    """Per-call latency in ms, and the responses."""
+    samples, responses = [], []
+    for call in calls:
+        started = time.perf_counter()
+        r = call()
+        samples.append((time.perf_counter() - started) * 1000)
+        r.raise_for_status()
+        responses.append(r)
+    return samples, responses
+
+def run(n_requests: int = 2000, warmup: int = 100) -> Results:
+    prefix = f"bench{int(time.time())}_"
+    users = [f"{prefix}{i:07d}" for i in range(n_requests)]
+    out: Results = {}
+    with TestClient(app) as client:
+        def assign(u):
+            return lambda: client.get("/assign", params={"user_id": u, "experiment": EXPERIMENT})
+
+        _timed([assign(f"{prefix}warm{i}") for i in range(warmup)])
+        started = time.perf_counter()
+        new, responses = _timed([assign(u) for u in users])
+        # throughput as wall time per 1000 requests, so lower is better like everything else
+        out["e2e.assign_new.s_per_1k"] = entry((time.perf_counter() - started) * 1000 / n_requests, "s")
+        variants = {u: r.json()["variant"] for u, r in zip(users, responses)}
+        cached, _ = _timed([assign(u) for u in users])
+        assignment_cache.clear()
+        stored, _ = _timed([assign(u) for u in users])
+        events, _ = _timed([
+            (lambda u=u: client.post("/event", json={
+                "user_id": u, "experiment_key": EXPERIMENT, "variant": variants[u],
+                "event_type": "signup_start", "metadata": {"device": "web", "country": "FR"},
+            }))
+            for u in users if variants[u]
+        ])
+    for name, samples in (("assign_new", new), ("assign_cached", cached),
+                          ("assign_stored", stored), ("event", events)):
+        out.update(latency(f"e2e.{name}", samples))
+    return out
@@ -0,0 +1,73 @@
+"""Timing helpers and the results file format shared by the bench suites.
+
+A results file is JSON:
+
+    {"meta": {...run info...},
+     "results": {"micro.stable_bucket": {"value": 1.9, "unit": "us"}, ...}}
+
+Every value is a cost (time per op, latency, wall time), so lower is
+better and `compare` can treat all of them the same way.
+"""
+import json, platform, subprocess, sys, time, timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+Results = Dict[str, dict]
+
+def per_op_us(fn: Callable[[], object], repeat: int = 5, min_time: float = 0.2) -> float:
+    """Best-of-`repeat` microseconds per call; each repeat runs for at least `min_time` s."""
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+def wall_s(fn: Callable[[], object]) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+def latency(prefix: str, samples_ms: Sequence[float]) -> Results:
+    """p50/p95/p99 entries for a list of per-request latencies in ms."""
+    p50, p95, p99 = np.percentile(np.asarray(samples_ms), [50, 95, 99])
+    return {f"{prefix}.{name}": entry(v, "ms") for name, v in (("p50", p50), ("p95", p95), ("p99", p99))}
+
+def entry(value: float, unit: str) -> dict:
+    return {"value": round(float(value), 4), "unit": unit}
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save(results: Results, path: str, suites: List[str], params: dict) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    meta = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_rev": _git_rev(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "suites": suites,
+        "params": params,
+    }
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": dict(sorted(results.items()))}, f, indent=2)
+
+def load(path: str) -> Results:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+def compare(baseline: Results, current: Results, threshold: float) -> List[dict]:
+    """One row per benchmark present in both; `regressed` when slower by more than `threshold`."""
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        base, cur = baseline[name]["value"], current[name]["value"]
+        ratio = cur / base if base else float("inf") if cur else 1.0
+        rows.append({"name": name, "unit": current[name]["unit"], "baseline": base, "current": cur,
+                     "ratio": ratio, "regressed": ratio > 1 + threshold,
+                     "improved": ratio < 1 / (1 + threshold)})
+    return rows
@@ -0,0 +1,56 @@
+"""Micro benchmarks of the per-request building blocks (no database).
+
+    python -m bench micro
+
+Bucketing, allocation lookup, config load, targeting and request/response
+model (de)serialisation, each timed in isolation as best-of-5 per call.
+"""
+import json
+from itertools import cycle
+
+from abcore.bucketing import stable_bucket, stable_buckets
+from abcore.config import pick_variant_by_bucket
+from api.config import load_config
+from api.main import AssignResponse, EventIn
+from api.metrics import Histogram
+
+from .harness import Results, entry, per_op_us
+
+EXPERIMENT = "onboarding_progressive_v1"
+ALLOCATION = {"A": 34, "B": 33, "C": 33}
+EVENT = {
+    "user_id": "u0012345",
+    "experiment_key": EXPERIMENT,
+    "variant": "B",
+    "event_type": "signup_start",
+    "metadata": {"device": "ios", "country": "FR"},
+}
+ATTRS = {"country": "FR", "device": "ios", "app_version": "2.3.1", "new_user": True}
+
+def run(n_users: int = 100_000) -> Results:
+    exp = load_config().experiments[EXPERIMENT]
+    users = [f"u{i:07d}" for i in range(n_users)]
+    next_user = cycle(users).__next__
+    buckets = cycle(range(100)).__next__
+    event_json = json.dumps(EVENT).encode()
+    event = EventIn.model_validate(EVENT)
+    histogram = Histogram("bench_seconds", "", ["method", "route", "status"])
+
+    results = {
+        "micro.stable_bucket": per_op_us(lambda: stable_bucket(next_user(), EXPERIMENT)),
+        "micro.pick_variant_by_bucket": per_op_us(lambda: pick_variant_by_bucket(ALLOCATION, buckets())),
+        "micro.variant_for_bucket": per_op_us(lambda: exp.variant_for_bucket(buckets())),
+        "micro.targeting_evaluate": per_op_us(lambda: exp.eligibility.evaluate(next_user(), ATTRS)),
+        "micro.event_validate": per_op_us(lambda: EventIn.model_validate(EVENT)),
+        "micro.event_validate_json": per_op_us(lambda: EventIn.model_validate_json(event_json)),
+        "micro.event_dump_json": per_op_us(event.model_dump_json),
+        "micro.metrics_observe": per_op_us(lambda: histogram.labels("GET", "/assign", "200").observe(0.003)),
+        "micro.assign_response_json": per_op_us(
+            lambda: AssignResponse(experiment_key=EXPERIMENT, variant="B", config_version="x").model_dump_json()),
+    }
+    out = {name: entry(us, "us") for name, us in results.items()}
+    # per user, amortised over one vectorised call
+    out["micro.stable_buckets_per_user"] = entry(
+        per_op_us(lambda: stable_buckets(users, EXPERIMENT), repeat=3) / n_users, "us")
+    out["micro.load_config"] = entry(per_op_us(load_config) / 1000, "ms")
+    return out
@@ -0,0 +1,85 @@
+"""dbt mart builds and analysis scripts on a fixed-size synthetic dataset.
+
+    BENCH_DATABASE_URL=postgresql+psycopg://.../abbench BENCH_DBT_TARGET=bench \\
+        python -m bench pipeline --users 200000
+
+DESTRUCTIVE for the bench database: assignments and events_raw there are
+truncated, then refilled by sims/generate_offline.py with a fixed seed,
+so runs at the same `--users` see the same data. BENCH_DATABASE_URL must
+be set and must differ from DATABASE_URL; the dbt target named by
+BENCH_DBT_TARGET (default `bench`) has to point at the same database.
+
+Timed steps (wall seconds): the load itself, `dbt run --full-refresh`
+with per-model times from run_results.json, an incremental `dbt run`
+after adding 10% more users on the last day, and the analysis scripts
+(frequentist, Bayesian, batch) as the user runs them.
+"""
+import json, os, shlex, subprocess, sys, tempfile, time
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import create_engine, text
+
+from .harness import Results, entry
+
+ROOT = Path(__file__).resolve().parents[1]
+BENCH_DB_URL = os.getenv("BENCH_DATABASE_URL")
+DBT = shlex.split(os.getenv("DBT", "dbt"))
+DBT_TARGET = os.getenv("BENCH_DBT_TARGET", "bench")
+SEED = 7
+
+ANALYSIS = {
+    "analyze_experiment": [sys.executable, "sims/analyze_experiment.py"],
+    "analyze_bayes": [sys.executable, "sims/analyze_bayes.py"],
+    "analysis_batch": [sys.executable, "-m", "analysis.batch", "--workers", "1"],
+}
+
+def _env() -> dict:
+    return {**os.environ, "DATABASE_URL": BENCH_DB_URL}
+
+def _timed_run(cmd, **kw) -> float:
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, env=_env(), capture_output=True, text=True, **kw)
+    elapsed = time.perf_counter() - started
+    if proc.returncode:
+        sys.stderr.write(proc.stdout[-4000:] + proc.stderr[-4000:])
+        raise SystemExit(f"pipeline: {shlex.join(cmd)} failed with exit code {proc.returncode}")
+    return elapsed
+
+def _generate(users: int, days: float, prefix: str) -> float:
+    return _timed_run([sys.executable, "sims/generate_offline.py", "--users", str(users), "--days", str(days),
+                       "--seed", str(SEED), "--user-prefix", prefix])
+
+def _dbt(prefix: str, args, out: Results, target_path: str) -> None:
+    wall = _timed_run([*DBT, "run", "--project-dir", "dbt", "--target", DBT_TARGET,
+                       "--target-path", target_path, *args])
+    out[f"{prefix}.total"] = entry(wall, "s")
+    with open(Path(target_path) / "run_results.json") as f:
+        for r in json.load(f)["results"]:
+            if r["unique_id"].startswith("model."):
+                out[f"{prefix}.{r['unique_id'].rsplit('.', 1)[-1]}"] = entry(r["execution_time"], "s")
+
+def run(users: int = 200_000, protect: Optional[str] = None) -> Results:
+    """`protect`: the working database URL, which the bench database must not be."""
+    if not BENCH_DB_URL:
+        raise SystemExit("pipeline: set BENCH_DATABASE_URL to a throwaway database (it gets truncated)")
+    if BENCH_DB_URL == protect:
+        raise SystemExit("pipeline: BENCH_DATABASE_URL must not be the working DATABASE_URL")
+
+    eng = create_engine(BENCH_DB_URL)
+    with eng.begin() as con:
+        con.execute(text("truncate assignments, events_raw restart identity"))
+    eng.dispose()
+
+    out: Results = {}
+    out["pipeline.generate"] = entry(_generate(users, 30, "bench_"), "s")
+    with tempfile.TemporaryDirectory() as target_path:
+        _dbt("pipeline.dbt_full", ["--full-refresh"], out, target_path)
+        _generate(users // 10, 1, "bench_inc_")
+        _dbt("pipeline.dbt_incremental", [], out, target_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, cmd in ANALYSIS.items():
+            if name == "analysis_batch":
+                cmd = [*cmd, "--out", str(Path(tmp) / "report.json")]
+            out[f"pipeline.{name}"] = entry(_timed_run(cmd), "s")
+    return out
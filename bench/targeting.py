@@ -0,0 +1,150 @@
+"""Per-request cost of targeting evaluation for large rule sets.
+
+    python -m bench.targeting [--rules 100 300 1000] [--requests 20000]
+    python -m bench.targeting --check
+
+Rules on country/device/app_version collapse at compile time; the
+`segment_<i>` rules each use their own attribute and stay separate, so
+the compiled rule count still grows with the config. Most requests pass
+every rule, so the full compiled list is walked (the worst case).
+
+`--check` evaluates every rule op against expected outcomes instead.
+"""
+import argparse
+import random
+import sys
+import time
+
+from abcore.targeting import compile_targeting
+
+COUNTRIES = ["FR", "DE", "ES", "IT", "NL", "BE", "PT", "AT", "PL", "SE"]
+DEVICES = ["ios", "android", "web"]
+
+def make_spec(n_rules: int, n_ids: int, rng: random.Random) -> dict:
+    rules = []
+    for i in range(n_rules):
+        kind = i % 4
+        if kind == 0:
+            rules.append({"attr": "country", "op": "in", "values": COUNTRIES})
+        elif kind == 1:
+            rules.append({"attr": "device", "op": "not_in", "values": ["tv", "watch"]})
+        elif kind == 2:
+            rules.append({"attr": "app_version", "op": "gte", "value": f"1.{rng.randint(0, 9)}.0"})
+        else:
+            rules.append({"attr": f"segment_{i}", "op": "in",
+                          "values": [f"s{j}" for j in range(50)]})
+    return {
+        "rules": rules,
+        "deny_user_ids": [f"deny{i}" for i in range(n_ids)],
+        "holdout_pct": 5,
+    }
+
+def make_requests(n: int, n_rules: int, rng: random.Random):
+    reqs = []
+    for i in range(n):
+        attrs = {
+            "country": rng.choice(COUNTRIES),
+            "device": rng.choice(DEVICES),
+            "app_version": f"2.{rng.randint(0, 20)}.{rng.randint(0, 9)}",
+        }
+        attrs.update({f"segment_{j}": f"s{rng.randint(0, 49)}" for j in range(3, n_rules, 4)})
+        reqs.append((f"u{i:07d}", attrs))
+    return reqs
+
+def run(n_rules: int, n_requests: int, n_ids: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    t0 = time.perf_counter()
+    targeting = compile_targeting("bench", make_spec(n_rules, n_ids, rng))
+    compile_ms = (time.perf_counter() - t0) * 1000
+    reqs = make_requests(n_requests, n_rules, rng)
+    evaluate = targeting.evaluate
+    t0 = time.perf_counter()
+    rejected = sum(1 for u, a in reqs if evaluate(u, a))
+    elapsed = time.perf_counter() - t0
+    return {
+        "rules": len(targeting),
+        "compile_ms": round(compile_ms, 2),
+        "us_per_eval": round(elapsed / n_requests * 1e6, 2),
+        "rejected_share": round(rejected / n_requests, 3),
+    }
+
+# (rule, attribute value, eligible?)
+CHECK_CASES = [
+    ({"attr": "plan", "op": "eq", "value": "pro"}, "pro", True),
+    ({"attr": "plan", "op": "eq", "value": "pro"}, " PRO ", True),
+    ({"attr": "plan", "op": "eq", "value": "pro"}, "team", False),
+    ({"attr": "plan", "op": "neq", "value": "pro"}, "team", True),
+    ({"attr": "plan", "op": "neq", "value": "pro"}, "pro", False),
+    ({"attr": "seats", "op": "eq", "value": 10}, "10.0", True),
+    ({"attr": "seats", "op": "eq", "value": 10}, "ten", False),
+    ({"attr": "seats", "op": "neq", "value": 10}, "ten", True),
+    ({"attr": "seats", "op": "gt", "value": 10}, 11, True),
+    ({"attr": "seats", "op": "gt", "value": 10}, 10, False),
+    ({"attr": "seats", "op": "gte", "value": "10"}, 10, True),
+    ({"attr": "seats", "op": "gte", "value": "10"}, 9.5, False),
+    ({"attr": "seats", "op": "lt", "value": 10}, 9, True),
+    ({"attr": "seats", "op": "lt", "value": 10}, 10, False),
+    ({"attr": "seats", "op": "lte", "value": 10}, 10, True),
+    ({"attr": "seats", "op": "lte", "value": 10}, "abc", False),
+    ({"attr": "app_version", "op": "gte", "value": "2.0"}, "2.10.1", True),
+    ({"attr": "app_version", "op": "gte", "value": "2.0"}, "1.9", False),
+    ({"attr": "sdk", "op": "lt", "value": "3.1"}, "3.0.9", True),
+    ({"attr": "sdk", "op": "eq", "value": "3.1"}, "3.1.0", True),
+    # mixed-length versions, including bare-number thresholds
+    ({"attr": "app_version", "op": "gte", "value": "3"}, "2.9.1", False),
+    ({"attr": "app_version", "op": "lt", "value": "3"}, "2.9.1", True),
+    ({"attr": "app_version", "op": "eq", "value": 3}, "3.0.0", True),
+    ({"attr": "app_version", "op": "gte", "value": "2.10"}, "2.9.1", False),
+    ({"attr": "app_version", "op": "lte", "value": "2.9.1.0"}, "2.9", True),
+    ({"attr": "sdk", "op": "gte", "value": "3"}, "2.9.1", False),
+    ({"attr": "sdk", "op": "gte", "value": 3}, "3.0.1", True),
+    ({"attr": "sdk", "op": "lt", "value": "3"}, "2.9.1", True),
+    ({"attr": "sdk", "op": "eq", "value": 3}, "3.0.0", True),
+    ({"attr": "beta", "op": "eq", "value": True}, True, True),
+    ({"attr": "beta", "op": "eq", "value": True}, "false", False),
+    ({"attr": "plan", "op": "in", "values": ["pro", "team"]}, "Team", True),
+    ({"attr": "plan", "op": "in", "values": ["pro", "team"]}, "free", False),
+    ({"attr": "plan", "op": "not_in", "values": ["free"]}, "free", False),
+    ({"attr": "plan", "op": "not_in", "values": ["free"]}, "pro", True),
+    ({"attr": "plan", "op": "eq", "value": "pro"}, None, True),  # attribute not sent
+]
+# ordering ops need a number or a version
+CHECK_INVALID = [
+    {"attr": "plan", "op": "gt", "value": "pro"},
+    {"attr": "plan", "op": "lte", "value": "team"},
+    {"attr": "plan", "op": "like", "value": "pro"},
+]
+
+def check() -> bool:
+    ok = True
+    for rule, value, eligible in CHECK_CASES:
+        attrs = {} if value is None else {rule["attr"]: value}
+        got = compile_targeting("check", {"rules": [rule]}).evaluate("u1", attrs) is None
+        ok &= got == eligible
+        print(f"[{'ok' if got == eligible else 'FAIL'}] {rule} {value!r} -> eligible={got}")
+    for rule in CHECK_INVALID:
+        try:
+            compile_targeting("check", {"rules": [rule]})
+        except ValueError as exc:
+            print(f"[ok] {rule} rejected: {exc}")
+        else:
+            ok = False
+            print(f"[FAIL] {rule} compiled")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rules", type=int, nargs="+", default=[10, 100, 300, 1000])
+    ap.add_argument("--requests", type=int, default=20_000)
+    ap.add_argument("--ids", type=int, default=100_000, help="size of the deny list")
+    ap.add_argument("--check", action="store_true", help="check rule semantics instead of timing")
+    args = ap.parse_args()
+    if args.check:
+        sys.exit(0 if check() else 1)
+    print(f"{'rules':>6} {'compile ms':>11} {'us/eval':>8} {'rejected':>9}")
+    for n in args.rules:
+        r = run(n, args.requests, args.ids)
+        print(f"{r['rules']:>6} {r['compile_ms']:>11} {r['us_per_eval']:>8} {r['rejected_share']:>9}")
+
+if __name__ == "__main__":
+    main()
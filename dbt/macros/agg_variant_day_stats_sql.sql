@@ -0,0 +1,93 @@
+{#-
+  Body of agg_variant_day_stats: per experiment, variant and exposure day,
+  the sufficient statistics every analysis needs (counts, successes, sums
+  and sums of squares). On incremental runs only the groups holding
+  fct_conversions rows rebuilt since the stored watermarks are
+  re-aggregated, together with the groups those users were in before the
+  rebuild (prev_variant / prev_exposure_ts), which a late assignment on
+  another day or variant moves them out of. A changed group left with no
+  users is emitted as an n_users = 0 placeholder so delete+insert clears
+  its old row; the models' post_hook then deletes the placeholder.
+
+  With segmented=true (agg_segment_stats) every user is counted once per
+  segment key (var segment_keys) under its value, 'unknown' when missing,
+  so the rows of one key partition the experiment × variant × day group.
+-#}
+{% macro agg_variant_day_stats_sql(segmented=false) -%}
+{%- set keys = var('segment_keys') if segmented else [] -%}
+with
+{% if is_incremental() %}
+rebuilt as (
+  select experiment_key, variant, exposure_ts, prev_variant, prev_exposure_ts
+  from {{ ref('fct_conversions') }}
+  where coalesce(last_event_id, 0) > (
+          select coalesce(max(last_event_id), 0) - {{ var('incremental_id_lookback') }} from {{ this }}
+        )
+     or coalesce(assignment_id, 0) > (
+          select coalesce(max(assignment_id), 0) - {{ var('incremental_id_lookback') }} from {{ this }}
+        )
+),
+changed as (
+  select experiment_key, variant, date_trunc('day', exposure_ts) as day from rebuilt
+  union
+  select experiment_key, prev_variant, date_trunc('day', prev_exposure_ts) from rebuilt
+  where prev_variant is not null
+),
+{% endif %}
+conv as (
+  select c.*, date_trunc('day', c.exposure_ts) as day
+    {%- if segmented %},
+    s.segment_key,
+    coalesce(s.segment_value, 'unknown') as segment_value
+    {%- endif %}
+  from {{ ref('fct_conversions') }} c
+  {%- if segmented %}
+  -- unpivot: one row per user and segment key
+  cross join lateral (values
+    {%- for key in keys %}
+    ('{{ key }}', c.{{ key }}::text){{ "," if not loop.last }}
+    {%- endfor %}
+  ) s(segment_key, segment_value)
+  {%- endif %}
+  {% if is_incremental() %}
+  where (c.experiment_key, c.variant, date_trunc('day', c.exposure_ts)) in (select * from changed)
+  {% endif %}
+)
+select
+  experiment_key,
+  variant,
+  day,
+  {%- if segmented %}
+  segment_key,
+  segment_value,
+  {%- endif %}
+  count(*)::bigint as n_users,
+  sum(started)::bigint as n_started,
+  sum(completed)::bigint as n_completed,
+  sum(converted)::bigint as n_converted,
+  sum(kyc_7d)::bigint as n_kyc,
+  sum(n_events)::bigint as sum_events,
+  sum(n_events::float8 * n_events) as sumsq_events,
+  count(hours_to_complete)::bigint as n_hours_to_complete,
+  coalesce(sum(hours_to_complete), 0) as sum_hours_to_complete,
+  coalesce(sum(hours_to_complete * hours_to_complete), 0) as sumsq_hours_to_complete,
+  max(last_event_id) as last_event_id,
+  max(assignment_id) as assignment_id
+from conv
+group by {{ "1,2,3,4,5" if segmented else "1,2,3" }}
+{% if is_incremental() %}
+union all
+-- changed groups nobody is left in
+select
+  c.experiment_key, c.variant, c.day,
+  {%- if segmented %}
+  null, null,
+  {%- endif %}
+  0, 0, 0, 0, 0, 0, 0, 0, 0, 0, null, null
+from changed c
+where not exists (
+  select 1 from conv
+  where conv.experiment_key = c.experiment_key and conv.variant = c.variant and conv.day = c.day
+)
+{% endif %}
+{%- endmacro %}
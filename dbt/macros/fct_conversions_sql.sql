@@ -0,0 +1,105 @@
+{#-
+  Body of fct_conversions. Events are read in one pass with conditional
+  aggregation. On incremental runs only exposures rebuilt since the last
+  run are recomputed, which covers late signup and KYC events (including
+  ones landing inside the 7-day window) for just the affected users.
+  Segment columns (var segment_keys) hold the first value the user's
+  events reported. funnel_depth is how many leading var funnel_steps the
+  user reached (a step listed in var funnel_step_windows only counts when
+  first reached within that interval of exposure); agg_experiment_funnel
+  counts it. prev_variant / prev_exposure_ts keep the variant and
+  exposure of the row an incremental run replaced (null on a full
+  refresh), so agg_variant_day_stats can re-aggregate the group a user
+  moved out of.
+-#}
+{% macro fct_conversions_sql() -%}
+{%- set steps = var('funnel_steps') %}
+{%- set windows = var('funnel_step_windows') %}
+with
+exposures as (
+  select *
+  from {{ ref('fct_exposures') }}
+  {% if is_incremental() %}
+  where coalesce(last_event_id, 0) > (
+          select coalesce(max(last_event_id), 0) - {{ var('incremental_id_lookback') }} from {{ this }}
+        )
+     or coalesce(assignment_id, 0) > (
+          select coalesce(max(assignment_id), 0) - {{ var('incremental_id_lookback') }} from {{ this }}
+        )
+  {% endif %}
+),
+user_events as (
+  select
+    e.user_id,
+    e.experiment_key,
+    bool_or(e.event_type = 'signup_start') as has_start,
+    bool_or(e.event_type = 'signup_complete') as has_complete,
+    count(*) as n_events,
+    min(e.ts) filter (where e.event_type = 'signup_complete') as complete_ts,
+    -- KYC completion within 7 days of exposure (guardrail)
+    min(e.ts) filter (where e.event_type = 'kyc_complete') as kyc_ts
+    {%- for step in steps %},
+    min(e.ts) filter (where e.event_type = '{{ step }}') as step_{{ loop.index }}_ts
+    {%- endfor %}
+    {%- for key in var('segment_keys') %},
+    (array_agg(e.{{ key }} order by e.ts) filter (where e.{{ key }} is not null))[1] as {{ key }}
+    {%- endfor %}
+  from {{ ref('stg_events_raw') }} e
+  {% if is_incremental() %}
+  where (e.user_id, e.experiment_key) in (select user_id, experiment_key from exposures)
+  {% endif %}
+  group by 1,2
+),
+joined as (
+  select
+    exp.user_id,
+    exp.experiment_key,
+    exp.variant,
+    exp.exposure_ts,
+    case when ue.has_start then 1 else 0 end as started,
+    case when ue.has_complete then 1 else 0 end as completed,
+    case when ue.has_complete then 1 else 0 end as converted,
+    case
+      when ue.kyc_ts is not null
+           and ue.kyc_ts <= exp.exposure_ts + interval '7 days'
+      then 1 else 0
+    end as kyc_7d,
+    coalesce(ue.n_events, 0) as n_events,
+    -- continuous metric, null for users who never completed
+    (extract(epoch from ue.complete_ts - exp.exposure_ts) / 3600.0)::float8 as hours_to_complete,
+    -- null for users without a kyc_complete event
+    (extract(epoch from ue.kyc_ts - exp.exposure_ts) / 3600.0)::float8 as hours_to_kyc,
+    -- leading funnel steps reached: step k counts only with every earlier one
+    case
+      {%- for n in range(steps | length, 0, -1) %}
+      when {% for step in steps[:n] -%}
+        ue.step_{{ loop.index }}_ts is not null
+        {%- if step in windows %} and ue.step_{{ loop.index }}_ts <= exp.exposure_ts + interval '{{ windows[step] }}'{% endif %}
+        {{- " and " if not loop.last }}
+      {%- endfor %} then {{ n }}
+      {%- endfor %}
+      else 0
+    end as funnel_depth,
+    {%- for key in var('segment_keys') %}
+    ue.{{ key }},
+    {%- endfor %}
+    exp.last_event_id,
+    exp.assignment_id,
+    {%- if is_incremental() %}
+    prev.variant as prev_variant,
+    prev.exposure_ts as prev_exposure_ts
+    {%- else %}
+    null::text as prev_variant,
+    null::timestamptz as prev_exposure_ts
+    {%- endif %}
+  from exposures exp
+  left join user_events ue
+    on ue.user_id = exp.user_id and ue.experiment_key = exp.experiment_key
+  {%- if is_incremental() %}
+  left join {{ this }} prev
+    on prev.user_id = exp.user_id and prev.experiment_key = exp.experiment_key
+  {%- endif %}
+)
+select *
+from joined
+{%- endmacro %}
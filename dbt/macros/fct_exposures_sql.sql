@@ -0,0 +1,74 @@
+{#-
+  Body of fct_exposures. On incremental runs only (user, experiment) pairs
+  with events or assignments past the stored id watermarks are rebuilt;
+  called outside an incremental model it returns the full-refresh result.
+  The changed-events scan is also bounded by the stored ts watermark so
+  Postgres only reads the newest events_raw partitions; backfills of events
+  older than `incremental_ts_lookback` need a --full-refresh.
+-#}
+{% macro fct_exposures_sql() -%}
+with
+{% if is_incremental() %}
+watermark as (
+  select
+    coalesce(max(last_event_id), 0) - {{ var('incremental_id_lookback') }} as event_id,
+    coalesce(max(last_event_ts), '-infinity'::timestamptz)
+      - interval '{{ var("incremental_ts_lookback") }}' as event_ts,
+    coalesce(max(assignment_id), 0) - {{ var('incremental_id_lookback') }} as assignment_id
+  from {{ this }}
+),
+changed as (
+  select user_id, experiment_key
+  from {{ ref('stg_events_raw') }}
+  where id > (select event_id from watermark)
+    and ts >= (select event_ts from watermark)
+  union
+  select user_id, experiment_key
+  from {{ ref('stg_assignments') }}
+  where assignment_id > (select assignment_id from watermark)
+),
+{% endif %}
+base as (
+  select
+    user_id,
+    experiment_key,
+    variant,
+    min(ts) as first_seen,
+    max(id) as last_event_id,
+    max(ts) as last_event_ts
+  from {{ ref('stg_events_raw') }}
+  {% if is_incremental() %}
+  where (user_id, experiment_key) in (select user_id, experiment_key from changed)
+  {% endif %}
+  group by 1,2,3
+),
+assign as (
+  -- Prefer stored assignment if it exists to enforce stickiness
+  select
+    a.user_id,
+    a.experiment_key,
+    a.variant,
+    a.assigned_at,
+    a.assignment_id
+  from {{ ref('stg_assignments') }} a
+  {% if is_incremental() %}
+  where (a.user_id, a.experiment_key) in (select user_id, experiment_key from changed)
+  {% endif %}
+),
+choose as (
+  select
+    coalesce(assign.user_id, base.user_id) as user_id,
+    coalesce(assign.experiment_key, base.experiment_key) as experiment_key,
+    coalesce(assign.variant, base.variant) as variant,
+    coalesce(assign.assigned_at, base.first_seen) as exposure_ts,
+    base.last_event_id,
+    base.last_event_ts,
+    assign.assignment_id
+  from base
+  full outer join assign
+    on base.user_id = assign.user_id
+   and base.experiment_key = assign.experiment_key
+)
+select *
+from choose
+{%- endmacro %}
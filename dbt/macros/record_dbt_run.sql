@@ -0,0 +1,26 @@
+{#-
+  on-run-end hook: append one row per `dbt run` / `dbt build` that built any
+  model to analytics.dbt_runs so readers of the marts (the dashboard cache)
+  can tell when the data last changed. Partial runs count: the models that
+  succeeded have changed even if others failed (models_failed says so).
+-#}
+{% macro record_dbt_run() -%}
+{% if execute and flags.WHICH in ('run', 'build') %}
+  {% set schema = generate_schema_name('analytics', none) %}
+  {% set failed = results | selectattr('status', 'in', ['error', 'fail']) | list | length %}
+  {% set built = results | selectattr('status', 'equalto', 'success') | list | length %}
+  {% if built > 0 %}
+    create schema if not exists {{ schema }};
+    create table if not exists {{ schema }}.dbt_runs (
+      invocation_id text primary key,
+      command text not null,
+      models_built int not null,
+      models_failed int not null default 0,
+      finished_at timestamptz not null default now()
+    );
+    alter table {{ schema }}.dbt_runs add column if not exists models_failed int not null default 0;
+    insert into {{ schema }}.dbt_runs (invocation_id, command, models_built, models_failed)
+    values ('{{ invocation_id }}', '{{ flags.WHICH }}', {{ built }}, {{ failed }});
+  {% endif %}
+{% endif %}
+{%- endmacro %}
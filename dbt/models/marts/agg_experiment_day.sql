@@ -1,16 +1,15 @@
 -- Daily metrics by experiment and variant
 with events as (
   select
-    date_trunc('day', exposure_ts) as day,
+    day,
     experiment_key,
     variant,
-    count(*) as users_exposed,
-    sum(started) as started,
-    sum(completed) as completed,
-    avg(converted::float) as conversion_rate,
-    avg(kyc_7d::float) as kyc_7d_rate
-  from {{ ref('fct_conversions') }}
-  group by 1,2,3
+    n_users as users_exposed,
+    n_started as started,
+    n_completed as completed,
+    n_converted::float / nullif(n_users, 0) as conversion_rate,
+    n_kyc::float / nullif(n_users, 0) as kyc_7d_rate
+  from {{ ref('agg_variant_day_stats') }}
 )
 select *
 from events
@@ -0,0 +1,39 @@
+-- Ordered funnel: users per step by experiment × variant × exposure day.
+-- Steps come from the `funnel_steps` var (event types, in order); step 0 is exposure.
+-- A user counts at step k only if they also reached every earlier step. Built from
+-- fct_conversions.funnel_depth, so runs aggregate the incremental mart instead of
+-- re-scanning events; steps in `funnel_step_windows` are labelled with their window.
+{{
+  config(
+    post_hook="create index if not exists {{ this.name }}_exp_idx on {{ this }} (experiment_key, variant, step_order, day)"
+  )
+}}
+{%- set steps = var('funnel_steps') %}
+{%- set windows = var('funnel_step_windows') %}
+with counts as (
+  select
+    experiment_key,
+    variant,
+    date_trunc('day', exposure_ts) as day,
+    count(*) as n_0
+    {%- for step in steps %},
+    count(*) filter (where funnel_depth >= {{ loop.index }}) as n_{{ loop.index }}
+    {%- endfor %}
+  from {{ ref('fct_conversions') }}
+  group by 1,2,3
+)
+select
+  c.experiment_key,
+  c.variant,
+  c.day,
+  f.step_order,
+  f.step,
+  f.n_users
+from counts c
+cross join lateral (
+  values
+    (0, 'exposed', c.n_0)
+    {%- for step in steps %},
+    ({{ loop.index }}, '{{ step }}{{ " ≤ " ~ windows[step] if step in windows }}', c.n_{{ loop.index }})
+    {%- endfor %}
+) as f(step_order, step, n_users)
@@ -0,0 +1,15 @@
+-- agg_variant_day_stats split by segment (var segment_keys): one row per
+-- experiment × variant × day × segment key × value. Incremental runs replace
+-- every segment row of a changed experiment × variant × day group.
+{{
+  config(
+    materialized='incremental',
+    unique_key=['experiment_key', 'variant', 'day'],
+    incremental_strategy='delete+insert',
+    post_hook=[
+      "delete from {{ this }} where n_users = 0",
+      "create index if not exists {{ this.name }}_exp_idx on {{ this }} (experiment_key, segment_key, segment_value, variant)"
+    ]
+  )
+}}
+{{ agg_variant_day_stats_sql(segmented=true) }}
@@ -0,0 +1,13 @@
+-- Sufficient statistics per experiment × variant × exposure day; analysis reads these instead of fct_conversions
+{{
+  config(
+    materialized='incremental',
+    unique_key=['experiment_key', 'variant', 'day'],
+    incremental_strategy='delete+insert',
+    post_hook=[
+      "delete from {{ this }} where n_users = 0",
+      "create index if not exists {{ this.name }}_exp_idx on {{ this }} (experiment_key, variant, day)"
+    ]
+  )
+}}
+{{ agg_variant_day_stats_sql() }}
@@ -1,14 +1,24 @@
 with src as (
   select
+    id,
     user_id,
-    experiment_key,
-    variant,
+    experiment_id,
+    variant_id,
     assigned_at
   from {{ source('raw', 'assignments') }}
+),
+experiments as (
+  select id, lower(key) as experiment_key from {{ source('raw', 'experiments') }}
+),
+variants as (
+  select id, upper(name) as variant from {{ source('raw', 'variants') }}
 )
 select
-  user_id,
-  lower(experiment_key) as experiment_key,
-  upper(variant) as variant,
-  assigned_at
-from src
+  a.id as assignment_id,
+  a.user_id,
+  x.experiment_key,
+  v.variant,
+  a.assigned_at
+from src a
+join experiments x on x.id = a.experiment_id
+join variants v on v.id = a.variant_id
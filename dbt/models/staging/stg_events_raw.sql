@@ -3,18 +3,38 @@ with src as (
     id,
     ts,
     user_id,
-    experiment_key,
-    variant,
-    event_type,
+    experiment_id,
+    variant_id,
+    event_type_id,
     metadata
   from {{ source('raw', 'events_raw') }}
+  {% if var('events_since', none) %}
+  -- e.g. --vars '{events_since: "2024-01-01"}' to restrict ad-hoc runs to recent partitions
+  where ts >= '{{ var("events_since") }}'::timestamptz
+  {% endif %}
+),
+-- events store dictionary ids; names are normalised once per dictionary row, not per event
+experiments as (
+  select id, lower(key) as experiment_key from {{ source('raw', 'experiments') }}
+),
+variants as (
+  select id, upper(name) as variant from {{ source('raw', 'variants') }}
+),
+event_types as (
+  select id, lower(name) as event_type from {{ source('raw', 'event_types') }}
 )
 select
-  id,
-  ts,
-  user_id,
-  lower(experiment_key) as experiment_key,
-  upper(variant) as variant,
-  lower(event_type) as event_type,
-  metadata
-from src
+  e.id,
+  e.ts,
+  e.user_id,
+  x.experiment_key,
+  v.variant,
+  t.event_type,
+  e.metadata
+  {%- for key in var('segment_keys') %},
+  nullif(e.metadata->>'{{ key }}', '')::text as {{ key }}
+  {%- endfor %}
+from src e
+join experiments x on x.id = e.experiment_id
+join variants v on v.id = e.variant_id
+join event_types t on t.id = e.event_type_id
@@ -0,0 +1,44 @@
+-- Incremental agg_segment_stats must equal a full re-aggregation of fct_conversions,
+-- and each segment key must partition the unsegmented counts.
+-- Float sums are rounded: summation order differs between the two paths.
+{% set columns %}
+    experiment_key, variant, day, segment_key, segment_value, n_users, n_started, n_completed,
+    n_converted, n_kyc, sum_events, round(sumsq_events::numeric, 6) as sumsq_events,
+    n_hours_to_complete, round(sum_hours_to_complete::numeric, 6) as sum_hours_to_complete,
+    round(sumsq_hours_to_complete::numeric, 6) as sumsq_hours_to_complete,
+    last_event_id, assignment_id
+{% endset %}
+with full_refresh as (
+  select {{ columns }}
+  from ( {{ agg_variant_day_stats_sql(segmented=true) }} ) f
+),
+current_rows as (
+  select {{ columns }}
+  from {{ ref('agg_segment_stats') }}
+),
+missing as (
+  select * from full_refresh
+  except
+  select * from current_rows
+),
+extra as (
+  select * from current_rows
+  except
+  select * from full_refresh
+),
+segment_totals as (
+  select experiment_key, variant, day, segment_key, sum(n_users) as n_users, sum(n_converted) as n_converted
+  from {{ ref('agg_segment_stats') }}
+  group by 1,2,3,4
+),
+unbalanced as (
+  select t.experiment_key, t.variant, t.day, t.segment_key
+  from segment_totals t
+  join {{ ref('agg_variant_day_stats') }} a using (experiment_key, variant, day)
+  where t.n_users <> a.n_users or t.n_converted <> a.n_converted
+)
+select 'missing' as diff, experiment_key, variant, day, segment_key, segment_value from missing
+union all
+select 'extra' as diff, experiment_key, variant, day, segment_key, segment_value from extra
+union all
+select 'unbalanced' as diff, experiment_key, variant, day, segment_key, null from unbalanced
@@ -0,0 +1,30 @@
+-- Incremental agg_variant_day_stats must equal a full re-aggregation of fct_conversions.
+-- Float sums are rounded: summation order differs between the two paths.
+{% set columns %}
+    experiment_key, variant, day, n_users, n_started, n_completed, n_converted, n_kyc,
+    sum_events, round(sumsq_events::numeric, 6) as sumsq_events, n_hours_to_complete,
+    round(sum_hours_to_complete::numeric, 6) as sum_hours_to_complete,
+    round(sumsq_hours_to_complete::numeric, 6) as sumsq_hours_to_complete,
+    last_event_id, assignment_id
+{% endset %}
+with full_refresh as (
+  select {{ columns }}
+  from ( {{ agg_variant_day_stats_sql() }} ) f
+),
+current_rows as (
+  select {{ columns }}
+  from {{ ref('agg_variant_day_stats') }}
+),
+missing as (
+  select * from full_refresh
+  except
+  select * from current_rows
+),
+extra as (
+  select * from current_rows
+  except
+  select * from full_refresh
+)
+select 'missing' as diff, * from missing
+union all
+select 'extra' as diff, * from extra
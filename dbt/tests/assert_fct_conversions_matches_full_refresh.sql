@@ -0,0 +1,31 @@
+-- Incremental fct_conversions must equal a full rebuild from fct_exposures.
+-- prev_variant / prev_exposure_ts record incremental history and are not compared.
+{% set columns %}
+    user_id, experiment_key, variant, exposure_ts,
+    started, completed, converted, kyc_7d, n_events, hours_to_complete, hours_to_kyc, funnel_depth,
+    {%- for key in var('segment_keys') %}
+    {{ key }},
+    {%- endfor %}
+    last_event_id, assignment_id
+{% endset %}
+with full_refresh as (
+  select {{ columns }}
+  from ( {{ fct_conversions_sql() }} ) f
+),
+current_rows as (
+  select {{ columns }}
+  from {{ ref('fct_conversions') }}
+),
+missing as (
+  select * from full_refresh
+  except
+  select * from current_rows
+),
+extra as (
+  select * from current_rows
+  except
+  select * from full_refresh
+)
+select 'missing' as diff, * from missing
+union all
+select 'extra' as diff, * from extra
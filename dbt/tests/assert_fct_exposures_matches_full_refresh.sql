@@ -0,0 +1,21 @@
+-- Incremental fct_exposures must equal a full rebuild from staging.
+with full_refresh as (
+  {{ fct_exposures_sql() }}
+),
+current_rows as (
+  select user_id, experiment_key, variant, exposure_ts, last_event_id, last_event_ts, assignment_id
+  from {{ ref('fct_exposures') }}
+),
+missing as (
+  select * from full_refresh
+  except
+  select * from current_rows
+),
+extra as (
+  select * from current_rows
+  except
+  select * from full_refresh
+)
+select 'missing' as diff, * from missing
+union all
+select 'extra' as diff, * from extra
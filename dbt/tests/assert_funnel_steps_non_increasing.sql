@@ -0,0 +1,9 @@
+-- Each funnel step can only keep or lose users relative to the step before it.
+select *
+from (
+  select
+    experiment_key, variant, day, step_order, n_users,
+    lag(n_users) over (partition by experiment_key, variant, day order by step_order) as prev_users
+  from {{ ref('agg_experiment_funnel') }}
+) f
+where n_users > prev_users
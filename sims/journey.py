@@ -0,0 +1,36 @@
+# sims/journey.py
+"""Seeded onboarding behaviour shared by the simulator and the load test.
+
+Everyone starts signup (with random device/country metadata), completes
+with a per-variant probability and, once completed, finishes KYC within
+7 days with `p_kyc_within7`. Randomness comes from the `rng` passed in,
+so a sequential run with one seeded RNG reproduces the same journeys.
+"""
+import random
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+DEVICES = ["ios", "android", "web"]
+COUNTRIES = ["FR", "DE", "ES", "IT", "NL"]
+
+Step = Tuple[str, Optional[dict]]
+
+@dataclass(frozen=True)
+class BehaviorModel:
+    p_complete_A: float = 0.40
+    p_complete_B: float = 0.55
+    p_kyc_within7: float = 0.80
+
+    def journey(self, variant: str, rng: random.Random) -> List[Step]:
+        """(event_type, metadata) steps one user emits after being assigned `variant`."""
+        md = {
+            "device": rng.choice(DEVICES),
+            "country": rng.choice(COUNTRIES),
+        }
+        steps: List[Step] = [("signup_start", md)]
+        p = self.p_complete_B if variant == "B" else self.p_complete_A
+        if rng.random() < p:
+            steps.append(("signup_complete", None))
+            if rng.random() < self.p_kyc_within7:
+                steps.append(("kyc_complete", None))
+        return steps
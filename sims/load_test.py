@@ -0,0 +1,179 @@
+# sims/load_test.py
+"""Concurrent load test for the API with per-endpoint latency percentiles.
+
+    python sims/load_test.py --users 5000 --concurrency 64 --ramp 5
+    python sims/load_test.py --rps 500 --duration 60 --ramp 10 --out load.json
+
+Each simulated user is one journey: GET /assign, then the /event calls
+the seeded behaviour model produces (sims/journey.py; per-variant
+completion and KYC probabilities). With `--repeat-assign P` a journey
+re-requests its assignment with probability P (the sticky read path).
+
+Closed loop by default: `--concurrency` journeys in flight, their number
+ramped up linearly over `--ramp` seconds. With `--rps` requests are
+paced open-loop at that rate (ramped from 0 over `--ramp`), still capped
+at `--concurrency` journeys in flight. Stops after `--users` journeys or
+`--duration` seconds, whichever comes first.
+
+The JSON report has throughput, error counts and p50/p95/p99 latency
+(ms) per endpoint and overall, for comparing runs.
+"""
+import argparse, asyncio, json, os, random, sys, time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from journey import BehaviorModel  # noqa: E402
+
+API = os.getenv("API_BASE", "http://127.0.0.1:8000")
+EXPERIMENT = "onboarding_progressive_v1"
+
+class Pacer:
+    """Hands out request slots at `rps`, ramping linearly from 0 over `ramp` seconds."""
+
+    def __init__(self, rps: Optional[float], ramp: float):
+        self.rps = rps
+        self.ramp = ramp
+        self.start = time.perf_counter()
+        self._next = self.start
+
+    def _rate(self, t: float) -> float:
+        if not self.ramp:
+            return self.rps
+        # floor of 1% so the first slots aren't infinitely far apart
+        return self.rps * min(1.0, max((t - self.start) / self.ramp, 0.01))
+
+    async def wait(self) -> None:
+        if not self.rps:
+            return
+        now = time.perf_counter()
+        slot = max(self._next, now)
+        self._next = slot + 1.0 / self._rate(slot)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+
+    async def call(self, client: httpx.AsyncClient, pacer: Pacer, endpoint: str, method: str, url: str, **kw):
+        await pacer.wait()
+        started = time.perf_counter()
+        try:
+            r = await client.request(method, url, **kw)
+        except httpx.HTTPError as e:
+            self.errors[endpoint][type(e).__name__] += 1
+            return None
+        self.latencies[endpoint].append((time.perf_counter() - started) * 1000)
+        if r.status_code >= 400:
+            self.errors[endpoint][str(r.status_code)] += 1
+            return None
+        return r
+
+    def report(self, elapsed: float) -> dict:
+        def summary(samples: List[float], errors: Counter) -> dict:
+            # latencies cover every response (4xx/5xx included); transport errors have none
+            lat = np.asarray(samples) if samples else np.zeros(1)
+            p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+            http_errors = sum(v for k, v in errors.items() if k.isdigit())
+            return {
+                "requests": len(samples) + sum(errors.values()) - http_errors,
+                "ok": len(samples) - http_errors,
+                "errors": dict(errors),
+                "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3),
+                "mean_ms": round(float(lat.mean()), 3),
+                "max_ms": round(float(lat.max()), 3),
+            }
+
+        endpoints = {ep: summary(self.latencies[ep], self.errors[ep])
+                     for ep in sorted(set(self.latencies) | set(self.errors))}
+        all_lat = [x for v in self.latencies.values() for x in v]
+        all_err = sum((self.errors[ep] for ep in self.errors), Counter())
+        return {"endpoints": endpoints, "overall": summary(all_lat, all_err)}
+
+async def journey(i: int, args, client: httpx.AsyncClient, pacer: Pacer, rec: Recorder, model: BehaviorModel):
+    # per-user RNG keeps journeys reproducible whatever order they run in
+    rng = random.Random(f"{args.seed}:{i}")
+    user_id = f"{args.user_prefix}{i:07d}"
+    params = {"user_id": user_id, "experiment": EXPERIMENT}
+    r = await rec.call(client, pacer, "/assign", "GET", "/assign", params=params)
+    if r is None:
+        return
+    variant = r.json()["variant"]
+    if variant is None:  # not eligible
+        return
+    if args.repeat_assign and rng.random() < args.repeat_assign:
+        await rec.call(client, pacer, "/assign", "GET", "/assign", params=params)
+    for event_type, md in model.journey(variant, rng):
+        payload = {"user_id": user_id, "experiment_key": EXPERIMENT, "variant": variant, "event_type": event_type}
+        if md:
+            payload["metadata"] = md
+        await rec.call(client, pacer, "/event", "POST", "/event", json=payload)
+
+async def run(args) -> dict:
+    model = BehaviorModel(args.p_complete_a, args.p_complete_b, args.p_kyc)
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    counter = iter(range(args.users))
+    started = time.perf_counter()
+    deadline = started + args.duration if args.duration else None
+    pacer = Pacer(args.rps, args.ramp)
+
+    async def worker(k: int):
+        if not args.rps and args.ramp:
+            await asyncio.sleep(args.ramp * k / args.concurrency)
+        for i in counter:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            await journey(i, args, client, pacer, rec, model)
+
+    async with httpx.AsyncClient(base_url=args.api, limits=limits, timeout=args.timeout) as client:
+        await asyncio.gather(*(worker(k) for k in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    report = rec.report(elapsed)
+    report["config"] = {
+        "api": args.api, "users": args.users, "concurrency": args.concurrency, "rps": args.rps,
+        "ramp_s": args.ramp, "duration_s": args.duration, "repeat_assign": args.repeat_assign, "seed": args.seed,
+    }
+    report["elapsed_s"] = round(elapsed, 3)
+    return report
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--api", default=API)
+    ap.add_argument("--users", type=int, default=3000, help="journeys to run")
+    ap.add_argument("--duration", type=float, default=0, help="stop after this many seconds (0 = no limit)")
+    ap.add_argument("--concurrency", type=int, default=32, help="journeys in flight (= pooled connections)")
+    ap.add_argument("--rps", type=float, default=None, help="target request rate (open loop)")
+    ap.add_argument("--ramp", type=float, default=0, help="seconds to ramp up load")
+    ap.add_argument("--repeat-assign", type=float, default=0.0, help="share of journeys re-fetching /assign")
+    ap.add_argument("--timeout", type=float, default=10.0)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--user-prefix", default=f"lt{int(time.time())}_",
+                    help="user id prefix; fresh by default so each run creates new assignments")
+    ap.add_argument("--p-complete-a", type=float, default=0.40)
+    ap.add_argument("--p-complete-b", type=float, default=0.55)
+    ap.add_argument("--p-kyc", type=float, default=0.80)
+    ap.add_argument("--out", default=None, help="write the JSON report here")
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+    print(text if not args.out else "")
+    for ep, s in {**report["endpoints"], "overall": report["overall"]}.items():
+        print(f"{ep:<10} {s['requests']:>8} req {s['rps']:>9.1f} rps  p50={s['p50_ms']:.1f}ms "
+              f"p95={s['p95_ms']:.1f}ms p99={s['p99_ms']:.1f}ms  errors={sum(s['errors'].values())}")
+
+if __name__ == "__main__":
+    main()
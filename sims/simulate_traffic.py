@@ -1,10 +1,17 @@
-import os, random, time, requests
+import os, random, sys, requests
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from journey import BehaviorModel  # noqa: E402
 
 API = os.getenv("API_BASE", "http://127.0.0.1:8000")
 EXPERIMENT = "onboarding_progressive_v1"
 
+# one keep-alive connection for the whole run instead of a new one per request
+session = requests.Session()
+
 def assign(user_id: str) -> str:
-    r = requests.get(f"{API}/assign", params={"user_id": user_id, "experiment": EXPERIMENT}, timeout=5)
+    r = session.get(f"{API}/assign", params={"user_id": user_id, "experiment": EXPERIMENT}, timeout=5)
     r.raise_for_status()
     return r.json()["variant"]
 
@@ -17,7 +24,7 @@ def event(user_id: str, variant: str, event_type: str, metadata=None):
     }
     if metadata:
         payload["metadata"] = metadata
-    r = requests.post(f"{API}/event", json=payload, timeout=5)
+    r = session.post(f"{API}/event", json=payload, timeout=5)
     r.raise_for_status()
 
 def main(
@@ -28,23 +35,13 @@ def main(
     seed=42
 ):
     random.seed(seed)
+    model = BehaviorModel(p_complete_A, p_complete_B, p_kyc_within7)
     for i in range(n_users):
         user_id = f"u{i:06d}"
         variant = assign(user_id)
 
-        # everyone starts signup
-        md = {
-            "device": random.choice(["ios","android","web"]),
-            "country": random.choice(["FR","DE","ES","IT","NL"])
-        }
-        event(user_id, variant, "signup_start", md)
-
-        # convert with different probabilities by variant
-        p = p_complete_B if variant == "B" else p_complete_A
-        if random.random() < p:
-            event(user_id, variant, "signup_complete")
-            if random.random() < p_kyc_within7:
-                event(user_id, variant, "kyc_complete")
+        for event_type, md in model.journey(variant, random):
+            event(user_id, variant, event_type, md)
 
         if i and i % 500 == 0:
             print(f"{i} users simulated")
@@ -6,29 +6,51 @@ create table if not exists experiments (
   created_at timestamptz not null default now()
 );
 
+-- Dictionaries for the low-cardinality text of assignments and events_raw:
+-- rows store small integer ids (experiments.id, variants.id, event_types.id)
+-- and the API maps names to ids in memory (api/ids.py). Names are stored as
+-- sent; the staging models normalise their case on these few rows.
+create table if not exists variants (
+  id smallserial primary key,
+  name text unique not null
+);
+
+create table if not exists event_types (
+  id smallserial primary key,
+  name text unique not null
+);
+
+-- fixed-width columns first, widest to narrowest, so rows carry no alignment padding
 create table if not exists assignments (
   id bigserial primary key,
-  user_id text not null,
-  experiment_key text not null,
-  variant text not null,
   assigned_at timestamptz not null default now(),
-  unique (user_id, experiment_key)
+  experiment_id int not null references experiments (id),
+  variant_id smallint not null references variants (id),
+  user_id text not null,
+  unique (user_id, experiment_id)
 );
 
-create index if not exists idx_assignments_experiment_key on assignments (experiment_key);
-create index if not exists idx_assignments_user on assignments (user_id);
+create index if not exists idx_assignments_experiment on assignments (experiment_id);
 
+-- Partitioned by day on ts so retention and scans scale with the active window.
+-- Daily partitions are managed by the functions in sql/partitions.sql (see
+-- scripts/partitions.py); the default partition catches anything outside them.
+-- The ids are not foreign keys: they only come from the dictionaries, and the
+-- per-row checks would sit on the hottest insert path.
 create table if not exists events_raw (
-  id bigserial primary key,
+  id bigserial,
   ts timestamptz not null default now(),
+  experiment_id int not null,
+  variant_id smallint not null,
+  event_type_id smallint not null,
   user_id text not null,
-  experiment_key text not null,
-  variant text not null,
-  event_type text not null,
-  metadata jsonb
-);
+  metadata jsonb,
+  primary key (id, ts)
+) partition by range (ts);
+
+create table if not exists events_raw_default partition of events_raw default;
 
-create index if not exists idx_events_experiment_ts on events_raw (experiment_key, ts);
+create index if not exists idx_events_experiment_ts on events_raw (experiment_id, ts);
 create index if not exists idx_events_user_ts on events_raw (user_id, ts);
 
 insert into experiments (key, name, enabled)
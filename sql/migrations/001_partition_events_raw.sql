@@ -0,0 +1,44 @@
+-- Convert an existing unpartitioned events_raw to the daily-partitioned layout
+-- from sql/init.sql. Run once with the API stopped:
+--   psql "$DATABASE_URL" -f sql/partitions.sql
+--   psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f sql/migrations/001_partition_events_raw.sql
+begin;
+
+lock table events_raw in access exclusive mode;
+
+alter table events_raw rename to events_raw_unpartitioned;
+alter index if exists idx_events_experiment_ts rename to idx_events_unpartitioned_experiment_ts;
+alter index if exists idx_events_user_ts rename to idx_events_unpartitioned_user_ts;
+
+create table events_raw (
+  id bigint not null default nextval('events_raw_id_seq'),
+  ts timestamptz not null default now(),
+  user_id text not null,
+  experiment_key text not null,
+  variant text not null,
+  event_type text not null,
+  metadata jsonb,
+  primary key (id, ts)
+) partition by range (ts);
+
+alter sequence events_raw_id_seq owned by events_raw.id;
+
+create table events_raw_default partition of events_raw default;
+create index idx_events_experiment_ts on events_raw (experiment_key, ts);
+create index idx_events_user_ts on events_raw (user_id, ts);
+
+-- one partition per day of existing history, plus the usual window ahead
+select create_events_partitions(
+  14,
+  coalesce((select current_date - min(ts)::date from events_raw_unpartitioned), 1)
+);
+
+insert into events_raw (id, ts, user_id, experiment_key, variant, event_type, metadata)
+select id, ts, user_id, experiment_key, variant, event_type, metadata
+from events_raw_unpartitioned;
+
+-- also drops the dbt staging views that still point at the old table;
+-- `make dbt` recreates them
+drop table events_raw_unpartitioned cascade;
+
+commit;
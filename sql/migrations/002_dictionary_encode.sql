@@ -0,0 +1,121 @@
+-- Convert assignments and events_raw to the dictionary-encoded layout from
+-- sql/init.sql: experiment_key, variant and event_type become integer ids into
+-- experiments, variants and event_types. Row ids and timestamps are kept, so the
+-- incremental dbt marts carry on from their watermarks. Run once with the API
+-- stopped, after sql/migrations/001:
+--   python scripts/storage_report.py --vacuum --out before.json
+--   psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f sql/migrations/002_dictionary_encode.sql
+--   python scripts/storage_report.py --vacuum --out after.json --compare before.json
+begin;
+
+lock table assignments, events_raw in access exclusive mode;
+
+create table if not exists variants (
+  id smallserial primary key,
+  name text unique not null
+);
+
+create table if not exists event_types (
+  id smallserial primary key,
+  name text unique not null
+);
+
+-- dictionaries from the distinct values in use
+insert into experiments (key, name)
+select k, k from (select experiment_key from assignments union select experiment_key from events_raw) s(k)
+on conflict (key) do nothing;
+
+insert into variants (name)
+select v from (select variant from assignments union select variant from events_raw) s(v)
+order by v
+on conflict (name) do nothing;
+
+insert into event_types (name)
+select distinct event_type from events_raw
+order by 1
+on conflict (name) do nothing;
+
+-- assignments: move the old table aside and drop what would clash by name
+alter table assignments rename to assignments_text;
+alter table assignments_text rename constraint assignments_pkey to assignments_text_pkey;
+alter table assignments_text drop constraint assignments_user_id_experiment_key_key;
+drop index if exists idx_assignments_experiment_key;
+-- covered by the leading column of the (user_id, experiment_id) unique index
+drop index if exists idx_assignments_user;
+
+create table assignments (
+  id bigint not null default nextval('assignments_id_seq'),
+  assigned_at timestamptz not null default now(),
+  experiment_id int not null references experiments (id),
+  variant_id smallint not null references variants (id),
+  user_id text not null
+);
+
+alter sequence assignments_id_seq owned by assignments.id;
+
+insert into assignments (id, assigned_at, experiment_id, variant_id, user_id)
+select a.id, a.assigned_at, x.id, v.id, a.user_id
+from assignments_text a
+join experiments x on x.key = a.experiment_key
+join variants v on v.name = a.variant
+order by a.id;
+
+-- indexes after the load: one sort each instead of row-by-row inserts
+alter table assignments add primary key (id);
+alter table assignments add unique (user_id, experiment_id);
+create index idx_assignments_experiment on assignments (experiment_id);
+
+-- events_raw: rename the old table and its partitions so the new ones can take their names
+alter table events_raw rename to events_raw_text;
+drop index if exists idx_events_experiment_ts;
+drop index if exists idx_events_user_ts;
+do $$
+declare
+  part record;
+begin
+  for part in
+    select c.relname from pg_inherits i join pg_class c on c.oid = i.inhrelid
+    where i.inhparent = 'events_raw_text'::regclass
+  loop
+    execute format('alter table %I rename to %I', part.relname, part.relname || '_text');
+  end loop;
+end;
+$$;
+
+create table events_raw (
+  id bigint not null default nextval('events_raw_id_seq'),
+  ts timestamptz not null default now(),
+  experiment_id int not null,
+  variant_id smallint not null,
+  event_type_id smallint not null,
+  user_id text not null,
+  metadata jsonb
+) partition by range (ts);
+
+alter sequence events_raw_id_seq owned by events_raw.id;
+
+create table events_raw_default partition of events_raw default;
+
+-- one partition per day of existing history, plus the usual window ahead
+select create_events_partitions(
+  14,
+  coalesce((select current_date - min(ts)::date from events_raw_text), 1)
+);
+
+insert into events_raw (id, ts, experiment_id, variant_id, event_type_id, user_id, metadata)
+select e.id, e.ts, x.id, v.id, t.id, e.user_id, e.metadata
+from events_raw_text e
+join experiments x on x.key = e.experiment_key
+join variants v on v.name = e.variant
+join event_types t on t.name = e.event_type;
+
+alter table events_raw add primary key (id, ts);
+create index idx_events_experiment_ts on events_raw (experiment_id, ts);
+create index idx_events_user_ts on events_raw (user_id, ts);
+
+-- also drops the dbt staging views that still point at the old tables;
+-- `make dbt` recreates them
+drop table events_raw_text cascade;
+drop table assignments_text cascade;
+
+commit;
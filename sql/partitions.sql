@@ -0,0 +1,74 @@
+-- Partition management for events_raw (daily range partitions on ts).
+
+-- Create daily partitions events_raw_pYYYYMMDD from days_back days ago to days_ahead days ahead.
+create or replace function create_events_partitions(days_ahead int default 14, days_back int default 1)
+returns setof text
+language plpgsql as $$
+declare
+  d date;
+  part text;
+begin
+  for d in
+    select generate_series(current_date - days_back, current_date + days_ahead, interval '1 day')::date
+  loop
+    part := format('events_raw_p%s', to_char(d, 'YYYYMMDD'));
+    if to_regclass(part) is not null then
+      continue;
+    end if;
+    if exists (select 1 from events_raw_default where ts >= d and ts < d + 1) then
+      -- rows for this day landed in the default partition: move them over first
+      execute format('create table %I (like events_raw including defaults including constraints)', part);
+      execute format(
+        'with moved as (delete from events_raw_default where ts >= %L and ts < %L returning *)
+         insert into %I select * from moved',
+        d::timestamptz, (d + 1)::timestamptz, part
+      );
+      execute format(
+        'alter table events_raw attach partition %I for values from (%L) to (%L)',
+        part, d::timestamptz, (d + 1)::timestamptz
+      );
+    else
+      execute format(
+        'create table %I partition of events_raw for values from (%L) to (%L)',
+        part, d::timestamptz, (d + 1)::timestamptz
+      );
+    end if;
+    return next part;
+  end loop;
+end;
+$$;
+
+-- Detach daily partitions that ended more than keep_days ago. They are moved to
+-- archive_schema when given (for export or later re-attach), otherwise dropped.
+create or replace function retire_events_partitions(keep_days int, archive_schema text default null)
+returns setof text
+language plpgsql as $$
+declare
+  part record;
+begin
+  if archive_schema is not null then
+    execute format('create schema if not exists %I', archive_schema);
+  end if;
+  for part in
+    select c.relname
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    where i.inhparent = 'events_raw'::regclass
+      and c.relname ~ '^events_raw_p[0-9]{8}$'
+      and to_date(substring(c.relname from 13), 'YYYYMMDD') + 1 <= current_date - keep_days
+    order by c.relname
+  loop
+    execute format('alter table events_raw detach partition %I', part.relname);
+    if archive_schema is not null then
+      execute format('alter table %I set schema %I', part.relname, archive_schema);
+    else
+      execute format('drop table %I', part.relname);
+    end if;
+    return next part.relname;
+  end loop;
+end;
+$$;
+
+-- pre-create the initial window (no-op until events_raw is partitioned)
+select create_events_partitions(14, 1)
+where (select relkind from pg_class where oid = to_regclass('events_raw')) = 'p';